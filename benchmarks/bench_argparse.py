@@ -0,0 +1,76 @@
+"""Measure the cost of adding many configurable instruments to the parser.
+
+Usage: python benchmarks/bench_argparse.py [NINSTRUMENTS]
+
+"eager" scrapes the attribute docstrings of every dataclass while building the
+parser, which is what add_from_model used to do. "lazy" is the current
+behaviour, where they are only scraped when the help is formatted.
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+from voir.argparse_ext import ExtendedArgumentParser, _scrape_attribute_docstrings
+
+
+def generate(n, nfields=8):
+    lines = ["from dataclasses import dataclass", ""]
+    for i in range(n):
+        lines += ["@dataclass", f"class Options{i}:"]
+        for j in range(nfields):
+            lines += [
+                f"    # Documentation for option {j} of instrument {i}",
+                f"    opt{i}_{j}: int = {j}",
+                "",
+            ]
+    return "\n".join(lines)
+
+
+def build(models, eager):
+    p = ExtendedArgumentParser()
+    for i, model in enumerate(models):
+        if eager:
+            _scrape_attribute_docstrings(model)
+        p.add_from_model(f"instrument{i}", model)
+    p.parse_args([])
+    return p
+
+
+def best(fn, repeat=10):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "options.py")
+        with open(path, "w") as f:
+            f.write(generate(n))
+        spec = importlib.util.spec_from_file_location("options", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["options"] = module
+        spec.loader.exec_module(module)
+        models = [getattr(module, f"Options{i}") for i in range(n)]
+
+        eager = best(lambda: build(models, eager=True))
+        lazy = best(lambda: build(models, eager=False))
+        first_help = best(lambda: build(models, eager=False).format_help(), repeat=1)
+        help_ = best(lambda: build(models, eager=False).format_help())
+
+    print(f"{n} configurable instruments")
+    print(f"eager:               {eager * 1000:8.2f} ms")
+    print(f"lazy:                {lazy * 1000:8.2f} ms")
+    print(f"lazy + help (first): {first_help * 1000:8.2f} ms")
+    print(f"lazy + help:         {help_ * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Measure the size of a monitor_all trace with and without compact encoding.
+
+Usage: python benchmarks/bench_compact_log.py [NSAMPLES]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from voir.instruments.cpu import cpu_monitor
+from voir.instruments.io import io_monitor
+from voir.instruments.network import network_monitor
+from voir.overseer import JsonlFileLogger
+
+
+def fake_gpudata(ndevices=8):
+    return {
+        str(i): {
+            "memory": [12345.5, 81920.0],
+            "load": 0.97,
+            "temperature": 64,
+            "power": 312.25,
+        }
+        for i in range(ndevices)
+    }
+
+
+def trace(n):
+    """Generate records shaped like what monitor_all gives."""
+    monitors = {
+        "gpudata": fake_gpudata,
+        "iodata": io_monitor(),
+        "netdata": network_monitor(),
+        "cpudata": cpu_monitor(),
+    }
+    samples = {k: fn() for k, fn in monitors.items()}
+    records = []
+    for i in range(n):
+        t = time.time()
+        for k, v in samples.items():
+            records.append({"task": "main", "time": t, k: v, "$queued": t})
+        records.append({"task": "train", "rate": 1234.5 + i, "units": "items/s"})
+    return records
+
+
+def measure(records, compact):
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    try:
+        logger = JsonlFileLogger(path, compact=compact)
+        t0 = time.perf_counter()
+        for record in records:
+            logger.log(record)
+        logger.close()
+        t1 = time.perf_counter()
+        return os.path.getsize(path), t1 - t0
+    finally:
+        os.unlink(path)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    records = trace(n)
+    plain_size, plain_time = measure(records, compact=False)
+    compact_size, compact_time = measure(records, compact=True)
+    print(f"records:  {len(records)}")
+    print(f"plain:    {plain_size:>12} bytes  {plain_time * 1000:8.1f} ms")
+    print(f"compact:  {compact_size:>12} bytes  {compact_time * 1000:8.1f} ms")
+    print(f"size reduction: {1 - compact_size / plain_size:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Measure the per-step overhead of voir.iterate against a bare for loop.
+
+The loops run as scripts under an Overseer, like they would under ``voir``.
+
+Usage: python benchmarks/bench_iterate.py [NSTEPS]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from voir.instruments import rate
+from voir.overseer import Overseer
+
+SCRIPT = """
+import json
+import sys
+
+from voir.helpers import iterate
+
+n = int(sys.argv[1])
+kwargs = json.loads(sys.argv[2])
+data = range(n)
+if kwargs is None:
+    for _ in data:
+        pass
+else:
+    for _ in iterate("bench", data, **kwargs):
+        pass
+"""
+
+
+def listen_progress(ov):
+    yield ov.phases.init
+    ov.given.where("progress") >> (lambda _: None)
+
+
+def measure(script, n, kwargs, instruments):
+    times = []
+
+    def timer(ov):
+        yield ov.phases.load_script
+        times.append(time.perf_counter_ns())
+        yield ov.phases.run_script
+        times.append(time.perf_counter_ns())
+
+    ov = Overseer(instruments=[timer, *instruments])
+    ov([script, str(n), json.dumps(kwargs)])
+    t0, t1 = times
+    return t1 - t0
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    cases = [
+        ("iterate, no instrument", {"report_batch": True}, []),
+        ("iterate, listener", {}, [listen_progress]),
+        ("iterate, rate", {"report_batch": True, "batch_size": 1}, [rate()]),
+        (
+            "iterate, rate, report_every=100",
+            {"report_batch": True, "batch_size": 1, "report_every": 100},
+            [rate()],
+        ),
+        (
+            "iterate, rate, report_every=0.1s",
+            {"report_batch": True, "batch_size": 1, "report_every": "0.1s"},
+            [rate()],
+        ),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "loop.py")
+        with open(script, "w") as f:
+            f.write(SCRIPT)
+
+        baseline = measure(script, n, None, [])
+        print(f"{'bare for loop':55} {baseline / n:8.1f} ns/step")
+        for title, kwargs, instruments in cases:
+            t = measure(script, n, kwargs, instruments)
+            print(f"{title:55} {t / n:8.1f} ns/step  (+{(t - baseline) / n:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compare the key filter of the log instrument with the fnmatch-based one.
+
+Usage: python benchmarks/bench_log.py [NRECORDS]
+"""
+
+import fnmatch
+import sys
+import time
+
+from voir.instruments.log import _keep
+
+
+def _keep_fnmatch(patterns, context):
+    """The implementation of _keep before patterns were compiled."""
+
+    def operation(data):
+        result = {}
+        ok = False
+        for k, v in data.items():
+            if k in context or any(fnmatch.fnmatch(k, p) for p in context):
+                result[k] = v
+            if k in patterns or any(fnmatch.fnmatch(k, p) for p in patterns):
+                result[k] = v
+                ok = True
+        return ok and result
+
+    return operation
+
+
+def records(n):
+    """Records shaped like what a training loop typically gives."""
+    layouts = [
+        lambda i: {"loss": i * 0.5, "task": "train", "step": i},
+        lambda i: {"batch": i, "step": i, "use_cuda": True},
+        lambda i: {"compute_start": i, "compute_end": i + 1, "step": i},
+        lambda i: {"accuracy": 0.5, "task": "valid", "epoch": i},
+    ]
+    return [layouts[i % len(layouts)](i) for i in range(n)]
+
+
+def measure(keep, data):
+    t0 = time.perf_counter()
+    for d in data:
+        keep(d)
+    return time.perf_counter() - t0
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    patterns = {"loss", "accuracy", "compute_*", "gpu*"}
+    context = {"task", "epoch", "step"}
+    data = records(n)
+    for name, factory in [("fnmatch", _keep_fnmatch), ("compiled", _keep)]:
+        t = measure(factory(patterns, context), data)
+        print(f"{name:<10} {t / n * 1e9:8.0f} ns per record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Measure the cost of updating counters, gauges, histograms and timers.
+
+As under the overseer, the metrics are summarized every so often, which is
+where histograms and timers put their values in buckets. That cost is reported
+separately, per update.
+
+Usage: python benchmarks/bench_metrics.py [NUPDATES]
+"""
+
+import sys
+import time
+
+from giving import give, given
+
+from voir.helpers import counter, gauge, histogram, timed
+
+
+def measure(fn, n, metric=None, every=10_000):
+    """Return the time per call of fn and the time per call of the summaries."""
+    updates = summaries = 0
+    for start in range(0, n, every):
+        t0 = time.perf_counter_ns()
+        for _ in range(min(every, n - start)):
+            fn()
+        t1 = time.perf_counter_ns()
+        if metric is not None:
+            metric.summary()
+        updates += t1 - t0
+        summaries += time.perf_counter_ns() - t1
+    return updates / n, summaries / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    c = counter("bench.counter")
+    g = gauge("bench.gauge")
+    h = histogram("bench.histogram")
+    timer = timed("bench.timed")
+
+    @timed("bench.timed")
+    def decorated():
+        pass
+
+    def block():
+        with timer:
+            pass
+
+    baseline, _ = measure(lambda: None, n)
+    cases = [
+        ("counter.inc()", c.inc, c),
+        ("counter.inc(3)", lambda: c.inc(3), c),
+        ("gauge.set(3)", lambda: g.set(3), g),
+        ("histogram.observe(3)", lambda: h.observe(3), h),
+        ("with timed(...)", block, timer.timer),
+        ("@timed(...) function", decorated, timer.timer),
+    ]
+    print(f"{'empty call':30} {baseline:8.1f} ns")
+    for title, fn, metric in cases:
+        t, summary = measure(fn, n, metric)
+        print(
+            f"{title:30} {t:8.1f} ns  (+{t - baseline:.1f})"
+            f"  summary {summary:6.1f} ns/update"
+        )
+
+    with given() as gv:
+        gv.subscribe(lambda _: None)
+        t, _ = measure(lambda: give(x=3), n // 10)
+    print(f"{'give(x=3), for comparison':30} {t:8.1f} ns  (+{t - baseline:.1f})")
+
+
+if __name__ == "__main__":
+    main()
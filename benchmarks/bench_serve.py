@@ -0,0 +1,73 @@
+"""Compare the launch latency of voir with and without ``voir serve``.
+
+Usage: python benchmarks/bench_serve.py [NRUNS] [MODULE...]
+
+The script that is launched imports the given modules (by default numpy if it
+is installed, otherwise asyncio), which the server preloads.
+"""
+
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def launch(script, env, n):
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        subprocess.run(
+            ["voir", script],
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            pass_fds=(),
+        )
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def report(label, times):
+    print(
+        f"{label:<6} mean {statistics.mean(times) * 1000:8.1f} ms"
+        f"   min {min(times) * 1000:8.1f} ms"
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    modules = sys.argv[2:] or [
+        "numpy" if importlib.util.find_spec("numpy") else "asyncio"
+    ]
+    with tempfile.TemporaryDirectory() as d:
+        script = os.path.join(d, "script.py")
+        with open(script, "w") as f:
+            f.write("".join(f"import {m}\n" for m in modules))
+        sock = os.path.join(d, "voir.sock")
+        env = {**os.environ, "VOIRFILE": ""}
+
+        cold = launch(script, env, n)
+
+        server = subprocess.Popen(
+            ["voir", "serve", "--socket", sock, "--preload", ",".join(modules)],
+            env=env,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while not os.path.exists(sock):
+                time.sleep(0.01)
+            warm = launch(script, {**env, "VOIR_SERVER": sock}, n)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{n} launches of a script importing {', '.join(modules)}")
+    report("cold", cold)
+    report("warm", warm)
+
+
+if __name__ == "__main__":
+    main()
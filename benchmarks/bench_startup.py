@@ -0,0 +1,56 @@
+"""Measure how long it takes to split a large script, with and without cache.
+
+Usage: python benchmarks/bench_startup.py [NFUNCS]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from voir.scriptutils import split_script
+
+
+def generate(nfuncs):
+    """Generate a script with many function definitions, like generated benchmarks."""
+    lines = ["import math", ""]
+    for i in range(nfuncs):
+        lines += [
+            f"def f{i}(x, y=1):",
+            f"    z = math.sqrt(x * {i} + y)",
+            "    for j in range(3):",
+            "        z = z * 0.5 + j",
+            "    return {'z': z, 'i': " + str(i) + "}",
+            "",
+        ]
+    lines += ["total = sum(f{0}(2)['z'] for _ in range(1))".format(nfuncs - 1)]
+    return "\n".join(lines)
+
+
+def measure(script, cache, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        split_script(script, cache=cache)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    nfuncs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    sys.dont_write_bytecode = False
+    with tempfile.TemporaryDirectory() as d:
+        script = os.path.join(d, "generated.py")
+        with open(script, "w") as f:
+            f.write(generate(nfuncs))
+        size = os.path.getsize(script)
+        nocache = measure(script, cache=False)
+        split_script(script)
+        cached = measure(script, cache=True)
+    print(f"script:    {nfuncs} functions, {size / 1024:.0f} KiB")
+    print(f"no cache:  {nocache * 1000:8.2f} ms")
+    print(f"cached:    {cached * 1000:8.2f} ms ({nocache / cached:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
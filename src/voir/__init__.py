@@ -1,12 +1,45 @@
-from .helpers import give, iterate, log
-from .tools import configurable, instrument_definition
+from . import startup  # isort: skip  # noqa: F401  (times the imports below)
 from .version import version as __version__
 
+# The public API is loaded on first access, so that importing voir (e.g. to
+# run the command line interface) does not pull in giving or ovld.
+_lazy = {
+    "aiterate": "helpers",
+    "counter": "helpers",
+    "gauge": "helpers",
+    "give": "helpers",
+    "histogram": "helpers",
+    "iterate": "helpers",
+    "log": "helpers",
+    "timed": "helpers",
+    "configurable": "tools",
+    "instrument_definition": "tools",
+}
+
 __all__ = [
+    "aiterate",
+    "counter",
+    "gauge",
     "give",
+    "histogram",
     "iterate",
     "log",
+    "timed",
     "configurable",
     "instrument_definition",
     "__version__",
 ]
+
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    value = getattr(importlib.import_module(f".{_lazy[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *__all__})
@@ -7,15 +7,16 @@ files and the like.
 
 import ast
 import inspect
+import os
 import tokenize
 import warnings
+import weakref
 from argparse import ArgumentParser
 from dataclasses import MISSING, dataclass, fields, is_dataclass
 from functools import partial
 from textwrap import dedent
 from typing import Union
 
-from omegaconf import OmegaConf
 from ovld import meta, ovld
 
 
@@ -30,6 +31,26 @@ class Info:
     group: ArgumentParser
 
 
+def _map_help(hlp, fn):
+    """Apply ``fn`` to a help string that may be computed lazily."""
+    if callable(hlp):
+        return lambda: fn(hlp())
+    return fn(hlp)
+
+
+def _add_argument(info, *args, help, **kwargs):
+    """Add an argument to ``info.group``, with a help string that may be lazy.
+
+    If ``help`` is callable, it is only called when the help is formatted.
+    """
+    if callable(help):
+        action = info.group.add_argument(*args, **kwargs)
+        info.parser.lazy_help[action] = help
+    else:
+        action = info.group.add_argument(*args, help=help, **kwargs)
+    return action
+
+
 def _dash(base):
     base = base.replace("_", "-")
     if len(base) == 1:
@@ -55,7 +76,6 @@ def contribute(default: meta(is_dataclass), info: Info):
     hlp = getattr(info.type, "__help__", None) or info.type.__name__
     if hlp:
         group = info.parser.add_argument_group(hlp)
-    docs = get_attribute_docstrings(info.type)
     if info.prefix is None:
         pfx = ""
     else:
@@ -67,7 +87,8 @@ def contribute(default: meta(is_dataclass), info: Info):
             Info(
                 name=field.name,
                 type=field.type,
-                help=docs.get(field.name, None),
+                # Scraping the docstrings is only needed to print the help
+                help=partial(_attribute_docstring, info.type, field.name),
                 annotation=None,
                 prefix=pfx,
                 parser=info.parser,
@@ -82,29 +103,34 @@ def contribute(default: bool, info: Info):  # noqa: F811
     pth = f"{info.prefix}{info.name}"
 
     is_default = "(Default) " if default is True else ""
-    info.group.add_argument(
+    _add_argument(
+        info,
         # f"--{pth}",
         _dash(pth),
         action="store_true",
         dest=pth,
         default=default,
-        help=f"{is_default}{hlp}",
+        help=_map_help(hlp, lambda h, d=is_default: f"{d}{h}"),
     )
 
     pth_no = f"{info.prefix}no-{info.name}"
     is_default = "(Default) " if default is False else ""
-    info.group.add_argument(
+    _add_argument(
+        info,
         _dash(pth_no),
         action="store_false",
         dest=pth,
         default=default,
-        help=hlp and f"{is_default}Do not {hlp[0].lower()}{hlp[1:]}",
+        help=_map_help(
+            hlp, lambda h, d=is_default: h and f"{d}Do not {h[0].lower()}{h[1:]}"
+        ),
     )
 
 
 @ovld
 def contribute(default: Union[int, float, str], info: Info):  # noqa: F811
-    info.group.add_argument(
+    _add_argument(
+        info,
         _dash(f"{info.prefix}{info.name}"),
         type=info.type,
         default=None if default is MISSING else default,
@@ -144,6 +170,7 @@ class ExtendedArgumentParser(ArgumentParser):
         self.base_configs = {}
         self.base_configs_locked = False
         self.used_base_configs = set()
+        self.lazy_help = {}
 
     def merge_base_config(self, config: dict):
         """Merge default values for the configurations.
@@ -170,6 +197,8 @@ class ExtendedArgumentParser(ArgumentParser):
             raise Exception(
                 "Cannot merge a base config after add_from_model is called."
             )
+        from omegaconf import OmegaConf
+
         self.base_configs = OmegaConf.merge(self.base_configs, config)
 
     def add_from_model(self, dest: str, model: type, flatten: bool = True):
@@ -213,6 +242,8 @@ class ExtendedArgumentParser(ArgumentParser):
         self.used_base_configs.add(dest)
         if dest in self.base_configs:
             assert model is MISSING
+            from omegaconf import OmegaConf
+
             model = OmegaConf.merge(OmegaConf.structured(typ), self.base_configs[dest])
 
         contribute[typ, Info](
@@ -228,6 +259,12 @@ class ExtendedArgumentParser(ArgumentParser):
             ),
         )
 
+    def format_help(self):
+        for action, hlp in self.lazy_help.items():
+            action.help = hlp()
+        self.lazy_help.clear()
+        return super().format_help()
+
     def _parse_known_args(self, *args, **kwargs):
         unused = set(self.base_configs) - self.used_base_configs
         if unused:
@@ -328,9 +365,21 @@ def scrape_variables_and_docstrings(src: str):
     return visitor.data
 
 
+_docstrings_cache = weakref.WeakKeyDictionary()
+
+
+def _source_mtime(cls):
+    try:
+        return os.stat(inspect.getsourcefile(cls)).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
 def get_attribute_docstrings(cls):
     """Get the docstrings for individual attributes of a class.
 
+    The result is memoized for each class, until its source file is modified.
+
     Arguments:
         cls: The class for which we want to get attribute documentation.
 
@@ -338,6 +387,18 @@ def get_attribute_docstrings(cls):
         A dict from variable name to its associated docstring (after itself) and/or
         comment (above itself).
     """
+    mtime = _source_mtime(cls)
+    cached = _docstrings_cache.get(cls, None)
+    if cached is None or cached[0] != mtime:
+        cached = _docstrings_cache[cls] = (mtime, _scrape_attribute_docstrings(cls))
+    return dict(cached[1])
+
+
+def _attribute_docstring(cls, name):
+    return get_attribute_docstrings(cls).get(name, None)
+
+
+def _scrape_attribute_docstrings(cls):
     docs = {}
     current = None
     current_line = None
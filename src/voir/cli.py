@@ -1,5 +1,7 @@
 """Command-line interface."""
 
+import importlib
+import json
 import operator
 import os
 import sys
@@ -9,7 +11,7 @@ from runpy import run_path
 
 from ovld import ovld
 
-from .overseer import Overseer
+from . import startup
 
 module = type(operator)
 
@@ -82,6 +84,11 @@ def _collect_instruments(voirfile, i):
         return results
 
 
+def _timed_collect_instruments(voirfile, i):
+    with startup.measure("voirfiles", voirfile):
+        return _collect_instruments(voirfile, i)
+
+
 def collect_instruments(voirfiles):
     """Collect instruments from a list of voirfiles.
 
@@ -90,29 +97,155 @@ def collect_instruments(voirfiles):
     """
     return reduce(
         operator.add,
-        [_collect_instruments(vf, i) for i, vf in enumerate(voirfiles)],
+        [_timed_collect_instruments(vf, i) for i, vf in enumerate(voirfiles)],
         [],
     )
 
 
-def collect_contrib_instruments():
-    """Collect instruments declared as entry points.
+ENTRY_POINT_GROUP = "voir.instrument"
+
+
+def _entry_point_cache_file():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "voir", "entry_points.json")
+
+
+def _environment_key():
+    """Identify the state of the installed packages.
 
-    This isn't really used, currently.
+    Installing or removing a distribution modifies the directory of
+    ``sys.path`` it lives in, so their modification times are a cheap way to
+    know when the entry points may have changed.
     """
+    key = [sys.executable]
+    for path in sys.path:
+        try:
+            key.append([path, os.stat(path or ".").st_mtime_ns])
+        except OSError:
+            key.append([path, None])
+    return key
+
+
+def entry_point_index(cache_file=None):
+    """List the ``voir.instrument`` entry points as ``(name, value)`` pairs.
+
+    The list is cached in ``$XDG_CACHE_HOME/voir/entry_points.json`` (by
+    default ``~/.cache/voir``) and only recomputed when ``sys.path`` or the
+    modification time of one of its directories changes.
+
+    Arguments:
+        cache_file: (optional) The path to the cache.
+    """
+    cache_file = _entry_point_cache_file() if cache_file is None else cache_file
+    key = _environment_key()
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+        if cached["key"] == key:
+            return [tuple(ep) for ep in cached["entry_points"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    from importlib.metadata import entry_points
+
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        eps = eps.select(group=ENTRY_POINT_GROUP)
+    else:  # pragma: no cover
+        # Python < 3.10
+        eps = eps.get(ENTRY_POINT_GROUP, [])
+    index = sorted({(ep.name, ep.value) for ep in eps})
+
+    tmp = f"{cache_file}.{os.getpid()}"
     try:
-        import pkg_resources
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp, "w") as f:
+            json.dump({"key": key, "entry_points": index}, f)
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass
+    return index
+
+
+def _load_entry_point(value):
+    """Load an entry point given as ``module:attr [extras]``."""
+    module_name, _, attr = value.partition("[")[0].partition(":")
+    obj = importlib.import_module(module_name.strip())
+    for part in filter(None, attr.strip().split(".")):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _voir_arguments(argv):
+    """Return the arguments that come before SCRIPT or ``-m``.
+
+    The options of the instruments are not known yet, so an argument that
+    follows an option may be its value or SCRIPT. It is taken to be SCRIPT
+    only if it is an existing file.
+    """
+    results = []
+    after_option = False
+    for arg in argv:
+        if arg in ("-m", "--"):
+            break
+        elif arg.startswith("-"):
+            after_option = "=" not in arg
+        elif after_option and not os.path.isfile(arg):
+            after_option = False
+        else:
+            break
+        results.append(arg)
+    return results
+
+
+def collect_contrib_instruments(argv=(), names=()):
+    """Collect instruments declared as ``voir.instrument`` entry points.
+
+    Entry points are only loaded if they are enabled, either by name, or
+    because the flag ``--<name>`` (underscores may be written as dashes) is
+    given on the command line before SCRIPT or ``-m``, which is how
+    :func:`~voir.tools.gated` instruments are turned on. The flags given
+    to the script itself are ignored.
 
-        results = []
-        for entry_point in pkg_resources.iter_entry_points("voir.instrument"):
-            results.append(entry_point.load())
-        return results
-    except ImportError:
-        return []
+    Arguments:
+        argv: The command line arguments.
+        names: The names of the entry points to load.
+    """
+    argv = _voir_arguments(argv)
+    results = []
+    for name, value in entry_point_index():
+        flags = {f"--{name}", f"--{name.replace('_', '-')}"}
+        if name in names or any(arg.split("=", 1)[0] in flags for arg in argv):
+            results.append(_load_entry_point(value))
+    return results
 
 
 def main(argv=None):
     """Entry point of the voir command line interface."""
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv[:1] == ["serve"]:
+        if startup.startup_profile is not None:
+            # Requests are profiled in the children, not in the server
+            startup.startup_profile.stop_imports()
+
+        from .serve import serve_main
+
+        return serve_main(argv[1:])
+
+    if server := os.environ.get("VOIR_SERVER", None):
+        from .serve import request
+
+        sys.exit(request(server, argv))
+
+    from .overseer import Overseer
+
+    if startup.startup_profile is not None:
+        startup.startup_profile.stop_imports()
+
     sys.path.insert(0, os.path.abspath(os.curdir))
 
     vfs = os.environ.get("VOIRFILE", None)
@@ -122,7 +255,21 @@ def main(argv=None):
         vfs = vfs.split()
 
     instruments = collect_instruments(vfs)
-    instruments.extend(collect_contrib_instruments())
-
-    ov = Overseer(instruments=instruments, logfile=int(os.environ.get("DATA_FD", 3)))
-    ov(sys.argv[1:] if argv is None else argv)
+    with startup.measure("voirfiles", "<entry points>"):
+        instruments.extend(
+            collect_contrib_instruments(
+                argv, os.environ.get("VOIR_INSTRUMENTS", "").replace(",", " ").split()
+            )
+        )
+
+    drain = os.environ.get("VOIR_DRAIN_INTERVAL", None)
+    metrics_interval = os.environ.get("VOIR_METRICS_INTERVAL", None)
+
+    ov = Overseer(
+        instruments=instruments,
+        logfile=int(os.environ.get("DATA_FD", 3)),
+        compact_log=os.environ.get("DATA_COMPACT", "0") not in ("", "0"),
+        drain_interval=float(drain) if drain else None,
+        metrics_interval=float(metrics_interval) if metrics_interval else 10,
+    )
+    ov(argv)
@@ -4,9 +4,21 @@ There is typically no reason to use these in a voirfile, but they may be useful
 a script run through Voir.
 """
 
+import bisect
+import functools
+import itertools
+import math
+import operator
+import pickle
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
 from contextvars import ContextVar
+from queue import Empty, Full, Queue
 
 from giving import give
+from giving.gvr import global_context, global_count, global_inherited
 
 current_overseer = ContextVar("current_overseer", default=None)
 
@@ -23,8 +35,177 @@ def log(**kwargs):
         ov.log(kwargs)
 
 
+def _listening():
+    """Return whether anything may listen to the steps given by iterate.
+
+    Under an overseer, this is only the case if its instruments subscribed to
+    the data of the steps, see ``listens_to_steps`` in ``voir.phase``.
+    """
+    handlers = global_context.get()
+    if not handlers:
+        return False
+    ov = current_overseer.get()
+    if ov is None or len(handlers) > 1:
+        return True
+    given = getattr(ov, "given", None)
+    if given is None or handlers[0] != given._push:
+        return True
+    return getattr(given, "listens_to_steps", True)
+
+
+def _parse_every(report_every):
+    """Parse ``report_every`` into a ``(is_time, value)`` tuple."""
+    if isinstance(report_every, str) and report_every.endswith("s"):
+        return True, float(report_every[:-1])
+    else:
+        return False, int(report_every)
+
+
+def _batch_kwargs(batch_size):
+    """Return the ``step`` arguments to use before the batch is known and a
+    function that computes them from the batch."""
+    if batch_size is None:
+
+        def get_kwargs(batch):
+            return {"batch": batch}
+
+        return {"batch": None}, get_kwargs
+
+    elif callable(batch_size):
+
+        def get_kwargs(batch):
+            return {"batch_size": batch_size(batch)}
+
+    else:
+
+        def get_kwargs(batch):
+            return {"batch_size": batch_size}
+
+    return {"batch_size": None}, get_kwargs
+
+
+def _pickled_error(exc):
+    """Pickle an exception, or a RuntimeError describing it if that fails."""
+    try:
+        return pickle.dumps(exc)
+    except Exception:
+        return pickle.dumps(RuntimeError(f"{type(exc).__name__}: {exc}"))
+
+
+def _prefetch_worker(iterable, queue, stopped, pickled=False):
+    # With pickled=True, items are pickled here rather than in the queue's
+    # feeder thread, which would only print the errors and drop the items
+    def put(entry):
+        while not stopped.is_set():
+            try:
+                queue.put(entry, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    try:
+        for item in iterable:
+            if not put(("item", pickle.dumps(item) if pickled else item)):
+                return
+        put(("end", None))
+    except BaseException as exc:
+        put(("error", _pickled_error(exc) if pickled else exc))
+
+
+class _Prefetcher:
+    """Iterator that pulls items from an iterable in the background.
+
+    Arguments:
+        iterable: The iterable to pull from.
+        size: The maximal number of items to fetch in advance.
+        mode: Either ``"thread"`` or ``"process"``. In process mode, the iterable
+            and its items must be picklable.
+    """
+
+    def __init__(self, iterable, size, mode="thread"):
+        if mode == "thread":
+            self.queue = Queue(maxsize=size)
+            self.stopped = threading.Event()
+            self.worker = threading.Thread(
+                target=_prefetch_worker,
+                args=(iterable, self.queue, self.stopped),
+                daemon=True,
+            )
+        elif mode == "process":
+            import multiprocessing
+
+            self.queue = multiprocessing.Queue(maxsize=size)
+            self.stopped = multiprocessing.Event()
+            self.worker = multiprocessing.Process(
+                target=_prefetch_worker,
+                args=(iterable, self.queue, self.stopped, True),
+                daemon=True,
+            )
+        else:
+            raise ValueError(
+                f"prefetch_mode must be 'thread' or 'process', not {mode!r}"
+            )
+        self.mode = mode
+        self.wait = 0
+        self.worker.start()
+
+    def __iter__(self):
+        return self
+
+    def _get(self):
+        while True:
+            try:
+                return self.queue.get(timeout=0.1)
+            except Empty:
+                if not self.worker.is_alive():
+                    break
+        # The worker may have put its last entry right before exiting
+        try:
+            return self.queue.get(timeout=0.1)
+        except Empty:
+            code = getattr(self.worker, "exitcode", None)
+            raise RuntimeError(
+                "The prefetch worker died before the end of the iterable"
+                + ("" if code is None else f" (exit code {code})")
+            )
+
+    def __next__(self):
+        t0 = time.perf_counter()
+        kind, value = self._get()
+        self.wait = time.perf_counter() - t0
+        if self.mode == "process" and value is not None:
+            value = pickle.loads(value)
+        if kind == "item":
+            return value
+        elif kind == "error":
+            raise value
+        else:
+            raise StopIteration()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ=None, exc=None, tb=None):
+        self.close()
+
+    def close(self):
+        """Stop the worker."""
+        self.stopped.set()
+        if self.mode == "process":
+            self.worker.terminate()
+        self.worker.join()
+
+
 def iterate(
-    task: str, iterable, report_batch=False, ignore_loading=False, batch_size=None
+    task: str,
+    iterable,
+    report_batch=False,
+    ignore_loading=False,
+    batch_size=None,
+    report_every=1,
+    prefetch=0,
+    prefetch_mode="thread",
 ):
     """Stream events along an iterative process.
 
@@ -103,6 +284,20 @@ def iterate(
             * If a function, it will be called on ``batch`` and the result will be
               given as ``batch_size``.
             * If a number, it will be given as ``batch_size`` directly.
+        report_every: Either a number of steps, as an int, or a string ``"Ns"``
+            where N is a number of seconds. Only one step every ``report_every``
+            is reported (its progress is given and it is wrapped if ``report_batch``
+            is ``True``), as well as the last one. Other steps only pay for the
+            iteration. Steps are never reported if nothing listens to ``give``,
+            or, when running under voir, if no instrument listens to them (e.g.
+            with ``ov.given.where("progress")`` or ``ov.given.wrap("step", ...)``).
+        prefetch: If greater than zero, up to ``prefetch`` batches are pulled from
+            the iterable in the background while the loop body runs. Each reported
+            step then also gives ``data_wait``, the number of seconds the step
+            waited for its batch.
+        prefetch_mode: Either ``"thread"`` (default), to prefetch in a thread,
+            or ``"process"``, to prefetch in a separate process. The latter
+            requires the iterable and the batches to be picklable.
     """
     assert isinstance(task, str)
     try:
@@ -110,45 +305,616 @@ def iterate(
     except TypeError:
         n = None
 
-    def prog(i):
-        if n is not None:
-            give(progress=(i, n))
+    every_is_time, every = _parse_every(report_every)
+    empty_kwargs, get_kwargs = _batch_kwargs(batch_size)
 
-    i = 0
-    with give.inherit(task=task):
-        prog(0)
+    if prefetch:
+        it = prefetcher = _Prefetcher(iterable, prefetch, prefetch_mode)
+    else:
         it = iter(iterable)
-        while True:
-            if i == n:
-                break
+        prefetcher = None
+
+    i = 0
+    deadline = time.perf_counter()
+    with give.inherit(task=task), prefetcher or nullcontext():
+        if n is not None:
+            give(progress=(0, n))
+        while i != n:
+            if every_is_time:
+                now = time.perf_counter()
+                report = now >= deadline
+                if report:
+                    deadline = now + every
+            else:
+                report = i % every == 0
             i += 1
 
-            def get_batch():
-                batch = next(it)
-                if batch_size is None:
-                    kwargs = {"batch": batch}
-                elif callable(batch_size):
-                    kwargs = {"batch_size": batch_size(batch)}
-                else:
-                    kwargs = {"batch_size": batch_size}
-                return batch, kwargs
+            if not (report and _listening()):
+                # Fast path: no give() at all for this step
+                try:
+                    batch = next(it)
+                except StopIteration:
+                    break
+                yield batch
+                if i == n and _listening():
+                    give(progress=(i, n))
+                continue
 
             try:
                 if not report_batch:
-                    batch, kwargs = get_batch()
+                    batch = next(it)
                     yield batch
                 elif ignore_loading:
-                    batch, kwargs = get_batch()
-                    with give.wrap("step", **kwargs):
+                    batch = next(it)
+                    with give.wrap("step", **get_kwargs(batch)):
                         yield batch
                 else:
-                    empty_kwargs = (
-                        {"batch": None} if batch_size is None else {"batch_size": None}
-                    )
                     with give.wrap("step", **empty_kwargs) as extra:
-                        batch, kwargs = get_batch()
-                        extra.update(kwargs)
+                        batch = next(it)
+                        extra.update(get_kwargs(batch))
                         yield batch
             except StopIteration:
                 break
-            prog(i)
+            if prefetcher is not None:
+                give(data_wait=prefetcher.wait)
+            if n is not None:
+                give(progress=(i, n))
+
+
+async def aiterate(
+    task: str,
+    iterable,
+    report_batch=False,
+    ignore_loading=False,
+    batch_size=None,
+    report_every=1,
+):
+    """Stream events along an asynchronous iterative process.
+
+    This is the counterpart of :func:`iterate` for async iterables, to be used
+    with ``async for``. It gives the same ``progress`` and ``step`` data, so that
+    the same instruments can be used. When ``report_batch`` is ``True``, the
+    ``step`` wrapper spans the ``await`` points of the loop body, so the time it
+    measures is the wall time of the step.
+
+    .. code-block:: python
+
+        async for batch in voir.aiterate("infer", stream, report_batch=True):
+            await process(batch)
+
+    As with :func:`iterate`, the data given in the loop body has the ``task``.
+
+    If the loop may be exited early, e.g. with ``break``, close the generator
+    right away with :func:`contextlib.aclosing` (or ``await it.aclose()`` before
+    Python 3.10). Otherwise, the last step only ends when the generator is
+    garbage collected, so the time measured for it is too long, and the data
+    given after the loop still has the ``task``.
+
+    .. code-block:: python
+
+        async with aclosing(voir.aiterate("infer", stream, report_batch=True)) as it:
+            async for batch in it:
+                if await process(batch):
+                    break
+
+    Arguments:
+        task: The name of the task that this iteration is doing.
+        iterable: An async iterable. If it has a ``len``, progress is given.
+        report_batch: Wrap each step with ``give.wrap("step", ...)``.
+        ignore_loading: Do not include the time to get the batch in the step.
+        batch_size: As for :func:`iterate`.
+        report_every: As for :func:`iterate`.
+    """
+    assert isinstance(task, str)
+    try:
+        n = len(iterable)
+    except TypeError:
+        n = None
+
+    every_is_time, every = _parse_every(report_every)
+    empty_kwargs, get_kwargs = _batch_kwargs(batch_size)
+    it = iterable.__aiter__()
+
+    # The task is set as with give.inherit and the step sentinels are given as
+    # with give.wrap, but without their context managers: an async generator
+    # that is abandoned mid-loop is closed in another task, where the context
+    # variable cannot be reset.
+    token = global_inherited.set({**global_inherited.get(), "task": task})
+    try:
+        i = 0
+        deadline = time.perf_counter()
+        if n is not None:
+            give(progress=(0, n))
+        while i != n:
+            if every_is_time:
+                now = time.perf_counter()
+                report = now >= deadline
+                if report:
+                    deadline = now + every
+            else:
+                report = i % every == 0
+            i += 1
+
+            if not (report and _listening()):
+                try:
+                    batch = await it.__anext__()
+                except StopAsyncIteration:
+                    break
+                yield batch
+                if i == n and _listening():
+                    give(progress=(i, n))
+                continue
+
+            step = None
+            try:
+                if not report_batch:
+                    batch = await it.__anext__()
+                elif ignore_loading:
+                    batch = await it.__anext__()
+                    step = _Step(task, get_kwargs(batch))
+                else:
+                    step = _Step(task, empty_kwargs)
+                    batch = await it.__anext__()
+                    step.keys.update(get_kwargs(batch))
+                yield batch
+            except StopAsyncIteration:
+                break
+            finally:
+                if step is not None:
+                    step.end()
+            if n is not None:
+                give(progress=(i, n))
+    finally:
+        try:
+            global_inherited.reset(token)
+        except ValueError:
+            # Closed in another task, the task remains set in the one that
+            # iterated until it finishes
+            pass
+
+
+class _Step:
+    """Give the begin and end sentinels of ``give.wrap("step", ...)``."""
+
+    def __init__(self, task, keys):
+        self.id = next(global_count)
+        self.keys = {"task": task, **keys}
+        give.produce(
+            {"$wrap": {"name": "step", "step": "begin", "id": self.id}, **self.keys}
+        )
+
+    def end(self):
+        give.produce(
+            {"$wrap": {"name": "step", "step": "end", "id": self.id}, **self.keys}
+        )
+
+
+###########
+# Metrics #
+###########
+
+
+_metrics = {}
+
+
+class Counter:
+    """Count events, e.g. tokens processed or cache hits.
+
+    Use :func:`counter` to create or fetch a ``Counter``.
+
+    Arguments:
+        name: The name of the counter.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name):
+        self.name = name
+        # Each thread increments its own cell, so that inc() needs no lock
+        self._local = threading.local()
+        self._cells = []
+        self._last_total = 0
+        self._last_time = time.perf_counter()
+
+    def inc(self, n=1):
+        """Increment the counter by ``n``."""
+        try:
+            self._local.cell[0] += n
+        except AttributeError:
+            cell = self._local.cell = [n]
+            self._cells.append(cell)
+
+    @property
+    def value(self):
+        """Current value of the counter."""
+        return sum(cell[0] for cell in self._cells)
+
+    def summary(self):
+        """Summarize the counter since the last call to ``summary``."""
+        now = time.perf_counter()
+        total = self.value
+        delta = total - self._last_total
+        rate = delta / (now - self._last_time)
+        self._last_total = total
+        self._last_time = now
+        return {"count": total, "delta": delta, "rate": rate}
+
+
+class Gauge:
+    """Hold the last value of a quantity, e.g. a queue size.
+
+    Use :func:`gauge` to create or fetch a ``Gauge``.
+
+    Arguments:
+        name: The name of the gauge.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name):
+        self.name = name
+        self.value = None
+
+    def set(self, value):
+        """Set the value of the gauge."""
+        self.value = value
+
+    def summary(self):
+        """Summarize the gauge."""
+        return None if self.value is None else {"value": self.value}
+
+
+# Positive buckets start above this, so that they stay positive for the
+# smallest exponents math.frexp can return (-1073)
+_BUCKET_OFFSET = 10_000
+
+
+def _bucket(x):
+    """Map a value to a log-scale bucket.
+
+    Each power of two is split into 8 buckets, so the relative error is at most
+    1/16. Buckets are ordered like the values they hold: zero has bucket 0 and
+    negative values have negative buckets.
+    """
+    if x > 0:
+        m, e = math.frexp(x)
+        return _BUCKET_OFFSET + e * 8 + int(m * 16 - 8)
+    elif x < 0:
+        return -_bucket(-x)
+    else:
+        return 0
+
+
+def _bucket_value(idx):
+    """Return the middle of the range of values that go in a bucket."""
+    if idx > 0:
+        e, sub = divmod(idx - _BUCKET_OFFSET, 8)
+        return math.ldexp((8 + sub + 0.5) / 16, e)
+    elif idx < 0:
+        return -_bucket_value(-idx)
+    else:
+        return 0.0
+
+
+def _bucket_end(values, idx, start):
+    """Return the index of the first value after ``start`` that is past bucket
+    ``idx``, in sorted ``values``."""
+    if idx > 0:
+        e, sub = divmod(idx - _BUCKET_OFFSET, 8)
+        return bisect.bisect_left(values, math.ldexp((9 + sub) / 16, e), start)
+    elif idx < 0:
+        e, sub = divmod(-idx - _BUCKET_OFFSET, 8)
+        return bisect.bisect_right(values, -math.ldexp((8 + sub) / 16, e), start)
+    else:
+        return bisect.bisect_right(values, 0, start)
+
+
+class _Distribution:
+    """Bounded-memory distribution of values.
+
+    Values are counted in log-scale buckets (see :func:`_bucket`), so that
+    memory use depends on the range of the values rather than on how many there
+    are. The mean and standard deviation are exact, using Welford's algorithm.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        """Add a value."""
+        self.count += 1
+        self.sum += x
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        b = _bucket(x)
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+
+    def update(self, values):
+        """Add a list of values.
+
+        This is much faster than calling :meth:`add` on each value: the values
+        are sorted, so that each bucket is counted with a binary search.
+        """
+        if not values:
+            return
+        values = sorted(values)
+        n = len(values)
+        batch = _Distribution()
+        batch.count = n
+        batch.sum = sum(values)
+        batch.mean = batch.sum / n
+        # Shift by the median to avoid cancellation in the sum of squares
+        shifted = list(map(operator.sub, values, itertools.repeat(values[n // 2])))
+        s1 = sum(shifted)
+        batch.m2 = max(0.0, sum(map(operator.mul, shifted, shifted)) - s1 * s1 / n)
+        batch.min = values[0]
+        batch.max = values[-1]
+        i = 0
+        while i < n:
+            b = _bucket(values[i])
+            j = _bucket_end(values, b, i)
+            batch.buckets[b] = j - i
+            i = j
+        self.merge(batch)
+
+    def merge(self, other):
+        """Add all the values counted in ``other``."""
+        if not other.count:
+            return
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.mean += delta * other.count / n
+        self.count = n
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for b, c in other.buckets.items():
+            self.buckets[b] = self.buckets.get(b, 0) + c
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)):
+        """Summarize the distribution, or return None if it is empty.
+
+        Quantiles are clamped to the exact minimum and maximum.
+        """
+        n = self.count
+        if not n:
+            return None
+        results = {
+            "count": n,
+            "mean": self.mean,
+            "std": math.sqrt(self.m2 / (n - 1)) if n > 1 else 0.0,
+            "min": self.min,
+            "max": self.max,
+        }
+        ordered = sorted(self.buckets.items())
+        for q in quantiles:
+            rank = min(n - 1, int(q * n))
+            seen = 0
+            for b, c in ordered:
+                seen += c
+                if seen > rank:
+                    break
+            value = min(max(_bucket_value(b), self.min), self.max)
+            results[f"p{q * 100:g}"] = value
+        return results
+
+
+# Histograms and timers append observations to a deque, which is thread-safe
+# and much cheaper than taking a lock. They are put in buckets when the metric
+# is summarized, or by the observation that makes them reach this number, so
+# that memory stays bounded.
+_PENDING_CAP = 1 << 16
+
+
+def _take(pending):
+    """Pop the values appended to ``pending`` so far, in a list."""
+    popleft = pending.popleft
+    return [popleft() for _ in range(len(pending))]
+
+
+class Histogram:
+    """Accumulate observations to summarize their distribution.
+
+    Use :func:`histogram` to create or fetch a ``Histogram``. Memory use depends
+    on the range of the observations, not on how many there are, and quantiles
+    are within about 6% of their true value.
+
+    Arguments:
+        name: The name of the histogram.
+        quantiles: The quantiles to report.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, quantiles=(0.5, 0.9, 0.99)):
+        self.name = name
+        self.quantiles = quantiles
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._values = _Distribution()
+
+    def observe(self, value):
+        """Add an observation."""
+        pending = self._pending
+        pending.append(value)
+        if len(pending) >= _PENDING_CAP:
+            self._fold()
+
+    def _fold(self):
+        with self._lock:
+            self._values.update(_take(self._pending))
+
+    def summary(self):
+        """Summarize the observations made since the last call to ``summary``."""
+        with self._lock:
+            values, self._values = self._values, _Distribution()
+            values.update(_take(self._pending))
+        results = values.summary(self.quantiles)
+        if results is not None:
+            results["sum"] = values.sum
+        return results
+
+
+class Timer(Histogram):
+    """Distribution of durations.
+
+    Use :func:`timed` to time code with a ``Timer``. Durations are recorded in
+    nanoseconds, but summarized in seconds.
+
+    Arguments:
+        name: The name of the timer.
+        quantiles: The quantiles to report.
+    """
+
+    kind = "timer"
+
+    def record(self, ns):
+        """Record a duration, in nanoseconds."""
+        pending = self._pending
+        pending.append(ns)
+        if len(pending) >= _PENDING_CAP:
+            self._fold()
+
+    def summary(self):
+        """Summarize the durations recorded since the last call to ``summary``.
+
+        All values are in seconds.
+        """
+        results = super().summary()
+        if results is not None:
+            results = {k: v if k == "count" else v / 1e9 for k, v in results.items()}
+        return results
+
+
+# Start times of the timed() blocks that are active in each thread. The blocks
+# nest, so a single stack per thread serves all timers.
+_timing_local = threading.local()
+
+
+class _Timing:
+    """Context manager and decorator that records durations into a Timer."""
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __enter__(self):
+        try:
+            _timing_local.starts.append(time.perf_counter_ns())
+        except AttributeError:
+            _timing_local.starts = [time.perf_counter_ns()]
+        return self
+
+    def __exit__(self, typ=None, exc=None, tb=None):
+        end = time.perf_counter_ns()
+        self.timer.record(end - _timing_local.starts.pop())
+
+    def __call__(self, fn):
+        record = self.timer.record
+
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            t0 = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(time.perf_counter_ns() - t0)
+
+        return wrapped
+
+
+def _metric(cls, name, **kwargs):
+    metric = _metrics.get(name, None)
+    if metric is None:
+        metric = _metrics.setdefault(name, cls(name, **kwargs))
+        ov = current_overseer.get()
+        if ov is not None:
+            ov._watch_metrics()
+    if metric.kind != cls.kind:
+        raise TypeError(f"Metric '{name}' is a {metric.kind}, not a {cls.kind}")
+    return metric
+
+
+def counter(name) -> Counter:
+    """Get the :class:`Counter` with the given name, creating it if needed.
+
+    Counters, gauges and histograms aggregate values in-process and are cheap
+    to update from any thread. Their summaries are logged periodically by the
+    overseer as ``{"$event": "metrics", "$data": {name: summary, ...}}``, and
+    at the end of the program, after which they are discarded, so that the
+    next run under the same process starts from scratch.
+
+    .. code-block:: python
+
+        tokens = voir.counter("tokens")
+        for batch in loader:
+            tokens.inc(len(batch))
+    """
+    return _metric(Counter, name)
+
+
+def gauge(name) -> Gauge:
+    """Get the :class:`Gauge` with the given name, creating it if needed.
+
+    See :func:`counter`.
+    """
+    return _metric(Gauge, name)
+
+
+def histogram(name, quantiles=(0.5, 0.9, 0.99)) -> Histogram:
+    """Get the :class:`Histogram` with the given name, creating it if needed.
+
+    See :func:`counter`.
+    """
+    return _metric(Histogram, name, quantiles=quantiles)
+
+
+def timed(name, quantiles=(0.5, 0.9, 0.99)):
+    """Time a block of code or each call to a function.
+
+    Durations are aggregated in the :class:`Timer` with the given name, whose
+    summary (count, mean, min, max and quantiles, in seconds) is logged like
+    the other metrics (see :func:`counter`).
+
+    .. code-block:: python
+
+        with voir.timed("forward"):
+            model(x)
+
+        @voir.timed("collate")
+        def collate(batch):
+            ...
+
+    Blocks are matched with the time they started in each thread, so in async
+    code, a block should not contain an ``await`` if other tasks may time blocks
+    in the meantime.
+
+    Arguments:
+        name: The name of the timer.
+        quantiles: The quantiles to report.
+    """
+    return _Timing(_metric(Timer, name, quantiles=quantiles))
+
+
+def summarize_metrics():
+    """Summarize all metrics, returning a dict from metric name to summary.
+
+    Metrics without anything to report are omitted.
+    """
+    results = {}
+    for name, metric in list(_metrics.items()):
+        summary = metric.summary()
+        if summary is not None:
+            results[name] = summary
+    return results
@@ -11,7 +11,9 @@ _instruments = {
     "gpu_monitor": "from .monitor import gpu_monitor",
     "monitor_all": "from .monitor import monitor_all",
     "rate": "from .metric import rate",
+    "energy": "from .metric import energy",
     "early_stop": "from .manage import early_stop",
+    "early_stop_converged": "from .manage import early_stop_converged",
 }
 
 
@@ -1,32 +1,137 @@
 """Log values automatically from the ``given`` stream."""
 
 import fnmatch
+import re
+import time
 
+from ..helpers import _parse_every
 from ..tools import instrument_definition
 
+# Maximal number of distinct key layouts remembered by _keep
+_max_layouts = 4096
+
+_unknown = object()
+
+
+def _matcher(patterns):
+    """Compile glob patterns into a function that tells if a key matches one."""
+    literals = {p for p in patterns if not any(c in p for c in "*?[")}
+    globs = [p for p in patterns if p not in literals]
+    if not globs:
+        return literals.__contains__
+    match = re.compile("|".join(fnmatch.translate(p) for p in globs)).match
+    return lambda k: k in literals or match(k) is not None
+
 
 def _keep(patterns, context):
     """Produce a function that filters a data dictionary with the patterns.
 
     Returns ``False`` if the data does not match.
+
+    The keys to keep only depend on the keys of the data, so the decision is
+    memoized for each key layout.
     """
+    in_patterns = _matcher(patterns)
+    in_context = _matcher(context)
+    layouts = {}
 
     def operation(data):
-        result = {}
-        ok = False
-        for k, v in data.items():
-            if k in context or any(fnmatch.fnmatch(k, p) for p in context):
-                result[k] = v
-            if k in patterns or any(fnmatch.fnmatch(k, p) for p in patterns):
-                result[k] = v
-                ok = True
-        return ok and result
+        layout = tuple(data)
+        keys = layouts.get(layout, _unknown)
+        if keys is _unknown:
+            if any(in_patterns(k) for k in layout):
+                keys = [k for k in layout if in_patterns(k) or in_context(k)]
+            else:
+                keys = None
+            if len(layouts) >= _max_layouts:
+                layouts.clear()
+            layouts[layout] = keys
+        return keys is not None and {k: data[k] for k in keys}
 
     return operation
 
 
+class _Window:
+    """Statistics accumulated over one window, for one task."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.n = 0
+        self.numbers = {}
+        self.others = {}
+
+
+class _Aggregate:
+    """Reduce records over windows of ``aggregate`` records or seconds, per task.
+
+    For each numeric key, the mean, min, max, last value and count over the
+    window are forwarded as a dictionary. Other keys are forwarded when their
+    value differs from the one that was last forwarded for the task. The
+    ``task`` key is always forwarded.
+    """
+
+    def __init__(self, aggregate, emit):
+        self.is_time, self.size = _parse_every(aggregate)
+        self.emit = emit
+        self.windows = {}
+        self.forwarded = {}
+
+    def __call__(self, data):
+        task = data.get("task", None)
+        window = self.windows.get(task, None)
+        if window is None:
+            window = self.windows[task] = _Window()
+        window.n += 1
+        numbers = window.numbers
+        for k, v in data.items():
+            if k == "task":
+                continue
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                stats = numbers.get(k, None)
+                if stats is None:
+                    numbers[k] = [1, v, v, v, v]
+                else:
+                    stats[0] += 1
+                    stats[1] += v
+                    if v < stats[2]:
+                        stats[2] = v
+                    if v > stats[3]:
+                        stats[3] = v
+                    stats[4] = v
+            else:
+                window.others[k] = v
+        if (
+            (time.monotonic() - window.start) >= self.size
+            if self.is_time
+            else window.n >= self.size
+        ):
+            self.flush(task)
+
+    def flush(self, task):
+        window = self.windows.pop(task)
+        forwarded = self.forwarded.setdefault(task, {})
+        result = {} if task is None else {"task": task}
+        for k, v in window.others.items():
+            if forwarded.get(k, _unknown) != v:
+                result[k] = forwarded[k] = v
+        for k, (count, total, low, high, last) in window.numbers.items():
+            result[k] = {
+                "mean": total / count,
+                "min": low,
+                "max": high,
+                "last": last,
+                "count": count,
+            }
+        if len(result) > (task is not None):
+            self.emit(result)
+
+    def flush_all(self):
+        for task in list(self.windows):
+            self.flush(task)
+
+
 @instrument_definition
-def log(ov, *patterns, context=[]):
+def log(ov, *patterns, context=[], aggregate=None):
     """Forward data from :attr:`~give.overseer.Overseer.given` into :attr:`~give.overseer.Overseer.log`.
 
     For each data dictionary in the ``given`` stream, all keys that match at least
@@ -56,9 +161,24 @@ def log(ov, *patterns, context=[]):
         If a patterns start with ``+``, that is equivalent to being in the context
         list, i.e. you can write ``log("x", "+y")`` instead of ``log("x", context="y")``
 
+    With ``aggregate``, matching records are reduced over a window before they
+    are forwarded, separately for each value of the ``task`` key. For example,
+    with ``log("loss", context=["task"], aggregate="5s")``, a loss given at
+    every step becomes one record every five seconds (or so) for each task:
+
+    .. code-block:: python
+
+        {"task": "train", "loss": {"mean": 1.2, "min": 0.9, "max": 1.5, "last": 1.0, "count": 9871}}
+
+    Non-numeric values are only forwarded when they change. Whatever is left
+    in the windows is forwarded at the end of the script.
+
     Arguments:
         patterns: Patterns for the keys to forward.
         context: Extra keys to forward ONLY IF at least one key matches the patterns.
+        aggregate: Either a number of records (e.g. ``100``) or a duration in
+            seconds as a string ending in ``s`` (e.g. ``"5s"``). If None,
+            records are forwarded one by one.
     """
 
     if not isinstance(context, (list, tuple)):
@@ -70,4 +190,13 @@ def log(ov, *patterns, context=[]):
     context = {*more_context, *context}
     patterns = {p for p in patterns if not p.startswith("+")}
 
-    ov.given.map(_keep(patterns, context)).filter(lambda x: x) >> ov.log
+    stream = ov.given.map(_keep(patterns, context)).filter(lambda x: x)
+    if aggregate is None:
+        stream >> ov.log
+    else:
+        aggregator = _Aggregate(aggregate, ov.log)
+        stream >> aggregator
+        try:
+            yield ov.phases.run_script
+        finally:
+            aggregator.flush_all()
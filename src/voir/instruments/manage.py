@@ -1,5 +1,9 @@
 """Manage the execution of the program."""
 
+import time
+from collections import deque
+
+from ..overseer import summarize_times
 from ..phase import StopProgram
 from ..tools import instrument_definition
 
@@ -55,3 +59,118 @@ def early_stop(ov, key, n, task=None, signal=StopProgram):
         lambda _, idx: {"task": "early_stop", "progress": (idx + 1, n)}
     ).give()
     stream.skip(n) >> _stop
+
+
+@instrument_definition
+def early_stop_converged(
+    ov,
+    task=None,
+    window=10,
+    ci=0.01,
+    cv=None,
+    min_samples=None,
+    max_samples=None,
+    budget=None,
+    signal=StopProgram,
+):
+    """Stop the program once the rate of computation is stable.
+
+    This watches the ``rate`` values given by :func:`~voir.instruments.rate`,
+    separately for each task, and stops the program as soon as the last
+    ``window`` rates of a task are stable enough. Stability is measured as:
+
+    * ``ci``: the half-width of the 95% confidence interval of the mean rate,
+      relative to the mean (0.01 means the mean is known to within 1%).
+    * ``cv``: the coefficient of variation of the rates, i.e. their standard
+      deviation divided by their mean.
+
+    If both are given, either one is sufficient to stop. Rates given with
+    ``steady=False`` (see the ``skip="auto"`` option of
+    :func:`~voir.instruments.rate`) are ignored.
+
+    .. code-block:: python
+
+        def instrument_xyz(ov):
+            yield ov.phases.init
+            ov.require(rate(interval="1s"))
+            ov.require(early_stop_converged(task="train", ci=0.01, budget=600))
+
+    An ``early_stop`` event is logged with the ``reason`` for stopping (one of
+    ``"converged"``, ``"max_samples"`` or ``"budget"``), the task and the
+    statistics of the window.
+
+    Arguments:
+        task: If not None, only watch rates with this task.
+        window: The number of most recent rates to look at.
+        ci: The threshold on the relative half-width of the confidence interval.
+        cv: The threshold on the coefficient of variation.
+        min_samples: The minimal number of rates to see for a task before it
+            can be considered stable (defaults to ``window``).
+        max_samples: Stop after this many rates for a task, even if they are
+            not stable.
+        budget: Stop after this many seconds of running the script, even if the
+            rates are not stable. This is checked when a rate is given.
+        signal: The exception to raise (defaults to :class:`voir.phase.StopProgram`)
+    """
+    min_samples = window if min_samples is None else max(min_samples, 2)
+    windows = {}
+    counts = {}
+    called = False
+
+    def _stop(reason, task, samples):
+        # The stop signal may have the unfortunate effect of creating
+        # another event, so this may get called twice.
+        nonlocal called
+        if called:
+            return
+        called = True
+        stats = summarize_times(samples) if samples else {}
+        ov.log(
+            {
+                "$event": "early_stop",
+                "$data": {
+                    "reason": reason,
+                    "task": task,
+                    "samples": counts.get(task, 0),
+                    "mean": stats.get("mean", None),
+                    "std": stats.get("std", None),
+                    "ci95": stats.get("ci95", None),
+                },
+            }
+        )
+        if isinstance(signal, str):
+            ov.log({"$event": signal})
+        else:
+            raise signal(reason)
+
+    def _check(data):
+        t = data.get("task", None)
+        samples = windows.get(t, None)
+        if samples is None:
+            samples = windows[t] = deque(maxlen=window)
+        samples.append(data["rate"])
+        n = counts[t] = counts.get(t, 0) + 1
+
+        if n >= min_samples and len(samples) >= 2:
+            stats = summarize_times(samples)
+            mean = stats["mean"]
+            if mean > 0:
+                low, high = stats["ci95"]
+                if (ci is not None and (high - low) / 2 / mean <= ci) or (
+                    cv is not None and stats["std"] / mean <= cv
+                ):
+                    _stop("converged", t, samples)
+        if max_samples is not None and n >= max_samples:
+            _stop("max_samples", t, samples)
+        if budget is not None and time.time() - start >= budget:
+            _stop("budget", t, samples)
+
+    yield ov.phases.init
+
+    stream = ov.given.where("rate").filter(lambda data: data.get("steady", True))
+    if task is not None:
+        stream = stream.where(task=task)
+    stream >> _check
+
+    yield ov.phases.load_script
+    start = time.time()
@@ -1,9 +1,11 @@
 import time
+from collections import deque
 from typing import Union
 
-from giving import Given
 from ovld import ovld
 
+from ..helpers import _Distribution
+from ..overseer import summarize_times
 from ..tools import instrument_definition
 
 
@@ -20,6 +22,84 @@ def _parse_duration(x: str):  # noqa: F811
         return (False, float(x))
 
 
+# Quantiles of step_time and step_rate
+_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Warmup:
+    """Detect the end of the warmup of a task from the rates of its intervals.
+
+    The task is steady once the coefficient of variation of its last ``window``
+    rates is at most ``tolerance``. The warmup is made of the intervals that
+    come before these.
+    """
+
+    def __init__(self, window, tolerance):
+        self.window = window
+        self.tolerance = tolerance
+        self.recent = deque(maxlen=window)
+        self.steady = False
+        self.intervals = 0
+        self.steps = 0
+        self.seconds = 0.0
+
+    def add(self, rate, steps, seconds):
+        """Add the rate of an interval, return whether the task just became steady."""
+        self.recent.append((rate, steps, seconds))
+        self.intervals += 1
+        self.steps += steps
+        self.seconds += seconds
+        if len(self.recent) < self.window:
+            return False
+        stats = summarize_times([r for r, _, _ in self.recent])
+        if stats["mean"] <= 0 or stats["std"] / stats["mean"] > self.tolerance:
+            return False
+        self.steady = True
+        for _, steps, seconds in self.recent:
+            self.intervals -= 1
+            self.steps -= steps
+            self.seconds -= seconds
+        return True
+
+    def report(self):
+        return {
+            "intervals": self.intervals,
+            "steps": self.steps,
+            "seconds": self.seconds,
+        }
+
+
+class _RateWindow:
+    """Running sums of one task over the current interval of ``rate``."""
+
+    __slots__ = (
+        "n",
+        "t",
+        "count",
+        "start",
+        "skip",
+        "warmup",
+        "step_time",
+        "step_rate",
+    )
+
+    def __init__(self, now, skip, warmup, distribution):
+        self.skip = skip
+        self.warmup = warmup
+        self.reset(now, distribution)
+
+    def reset(self, now, distribution):
+        self.n = 0
+        self.t = 0
+        self.count = 0
+        self.start = now
+        if distribution:
+            self.step_time = _Distribution()
+            self.step_rate = _Distribution()
+        else:
+            self.step_time = self.step_rate = None
+
+
 def default_batch_size_calc(batch):
     if isinstance(batch, (list, tuple)):
         return len(batch[0])
@@ -35,6 +115,9 @@ def rate(
     method=None,
     batch_size_calc=default_batch_size_calc,
     sync=None,
+    distribution=True,
+    steady_window=5,
+    steady_tolerance=0.05,
 ):
     """Compute a rate of computation, in items/s
 
@@ -80,8 +163,18 @@ def rate(
         ov: The overseer.
         interval: Either the number of step events between two rate calculations, as an
             int, or the string "Ns" where N is the number of seconds between two rate
-            calculations.
-        skip: The number of rate calculations to skip (think of it as a warmup period).
+            calculations. The rate of an interval is computed at the first step that
+            reaches it, from running sums, so memory use does not grow with the
+            length of the interval.
+        skip: The number of rate calculations to skip (think of it as a warmup period),
+            or ``"auto"`` to detect the end of the warmup of each task. In that case,
+            a task is considered steady once the last ``steady_window`` rates vary by
+            at most ``steady_tolerance`` (as a coefficient of variation). Every rate
+            given after that has ``steady=True``, and the ones before have
+            ``steady=False``. A ``warmup`` event reports the task and the number of
+            ``intervals``, ``steps`` and ``seconds`` of the warmup, which ends where
+            the stable window begins. A warmup that plateaus for ``steady_window``
+            intervals will be mistaken for the steady state.
         method: Either "delta" or "wrap" depending on whether you want to use Method
             1 or Method 2 as described above.
         batch_size_calc: A function to compute the batch size from the "batch" (e.g.
@@ -92,93 +185,320 @@ def rate(
             be timed along with the rest. For example, if running on a CUDA GPU, pass
             ``torch.cuda.synchronize`` to ensure that all pending calculations are taken
             into account in the rate calculation.
+        distribution: Also report the distribution of the time of each step
+            (``step_time``, in seconds) and of the throughput of each step
+            (``step_rate``, in items/s) in each interval. Each is a dictionary
+            with the ``count``, ``mean``, ``std``, ``min``, ``max``, ``p50``,
+            ``p95`` and ``p99``. At the end, a ``rate_summary`` event gives the overall
+            rate and distributions for each task, over the whole run (except
+            the skipped intervals, or the intervals until the steady state is
+            detected with ``skip="auto"``). Quantiles are approximated within
+            about 6% with bounded memory.
+        steady_window: The number of rates to look at when ``skip="auto"``.
+        steady_tolerance: The maximal coefficient of variation of the rates in
+            the window for the task to be considered steady, when ``skip="auto"``.
     """
 
     yield ov.phases.load_script
 
     interval_is_time, interval = _parse_duration(interval)
-
-    # Build stream of task/time/batch_size
-    if method is None or method == "delta":
-        steps_w_batch = ov.given.where("task", "batch", "!batch_size", "!$wrap").kmap(
-            task=lambda task: task, batch_size=lambda batch: batch_size_calc(batch)
+    auto_skip = skip == "auto"
+    if auto_skip and steady_window < 2:
+        raise ValueError("steady_window must be at least 2")
+    if interval_is_time:
+        interval = interval * 1_000_000_000
+    use_delta = method is None or method == "delta"
+    use_wrap = method is None or method == "wrap"
+
+    windows = {}
+    totals = {}
+    # Time of the last "delta" step, shared by all tasks
+    last = [None]
+    # Start times of the "step" wrappers that are in progress, by wrap id
+    starts = {}
+
+    def _emit(task, w, now):
+        n, t, count = w.n, w.t, w.count
+        step_time, step_rate = w.step_time, w.step_rate
+        w.reset(now, distribution)
+
+        if w.skip:
+            w.skip -= 1
+            return
+
+        if sync is not None:
+            t0 = time.time_ns()
+            sync()
+            t1 = time.time_ns()
+            t += (t1 - t0) / 1_000_000_000
+
+        if not (n and t):
+            return
+
+        extra = {}
+        warmup = w.warmup
+        if warmup is not None:
+            extra["steady"] = warmup.steady
+            if not warmup.steady and warmup.add(n / t, count, t):
+                # Only count the steady state in the summary
+                totals.pop(task, None)
+                ov.log({"$event": "warmup", "$data": {"task": task, **warmup.report()}})
+
+        if not distribution:
+            ov.give(rate=n / t, units="items/s", task=task, **extra)
+            return
+
+        ov.give(
+            rate=n / t,
+            units="items/s",
+            task=task,
+            step_time=step_time.summary(_QUANTILES),
+            step_rate=step_rate.summary(_QUANTILES),
+            **extra,
         )
-        steps_w_batch_size = ov.given.where("task", "batch_size", "!$wrap")
-        times = times_step = (
-            (steps_w_batch | steps_w_batch_size)
-            .augment(time=lambda: time.time_ns())
-            .pairwise()
-            .starmap(
-                lambda x, y: {
-                    "task": y["task"],
-                    "time": (y["time"] - x["time"]) / 1_000_000_000,
-                    "batch_size": y["batch_size"],
-                }
+
+        if warmup is not None and warmup.steady and not extra["steady"]:
+            # This interval completed the window that proved the steady state
+            return
+
+        total = totals.get(task, None)
+        if total is None:
+            total = totals[task] = [0, 0, _Distribution(), _Distribution()]
+        total[0] += n
+        total[1] += t
+        total[2].merge(step_time)
+        total[3].merge(step_rate)
+
+    def _add(task, seconds, batch_size, now):
+        w = windows.get(task, None)
+        if w is None:
+            w = windows[task] = _RateWindow(
+                now,
+                0 if auto_skip else skip,
+                _Warmup(steady_window, steady_tolerance) if auto_skip else None,
+                distribution,
             )
-        )
+        w.n += batch_size
+        w.t += seconds
+        w.count += 1
+        if distribution:
+            w.step_time.add(seconds)
+            if seconds > 0:
+                w.step_rate.add(batch_size / seconds)
+        if interval_is_time:
+            if now - w.start >= interval:
+                _emit(task, w, now)
+        elif w.count >= interval:
+            _emit(task, w, now)
+
+    def _batch_size(data):
+        bs = data.get("batch_size", None)
+        if bs is None:
+            batch = data.get("batch", None)
+            if batch is None:
+                return None
+            bs = batch_size_calc(batch)
+        return bs
+
+    @ov.given.subscribe
+    def _(data):
+        wrap = data.get("$wrap", None)
+        if wrap is None:
+            if not use_delta or "task" not in data:
+                return
+            bs = _batch_size(data)
+            if bs is None:
+                return
+            now = time.time_ns()
+            previous, last[0] = last[0], now
+            if previous is not None:
+                _add(data["task"], (now - previous) / 1_000_000_000, bs, now)
+
+        elif use_wrap and wrap["name"] == "step":
+            if wrap["step"] == "begin":
+                starts[wrap["id"]] = time.time_ns()
+                return
+            t0 = starts.pop(wrap["id"], None)
+            if t0 is None:
+                return
+            now = time.time_ns()
+            bs = _batch_size(data)
+            if bs is None or "task" not in data:
+                return
+            _add(data["task"], (now - t0) / 1_000_000_000, bs, now)
+
+    if not distribution:
+        return
+
+    yield ov.phases.finalize
+
+    if totals:
+        summary = {}
+        for task, (n, t, step_time, step_rate) in totals.items():
+            summary[task] = entry = {
+                "rate": n / t,
+                "units": "items/s",
+                "steps": step_time.count,
+                "step_time": step_time.summary(_QUANTILES),
+                "step_rate": step_rate.summary(_QUANTILES),
+            }
+            warmup = windows[task].warmup
+            if warmup is not None:
+                entry["steady"] = warmup.steady
+                entry["warmup"] = warmup.report() if warmup.steady else None
+        ov.log({"$event": "rate_summary", "$data": summary})
+
+
+class _Energy:
+    """Integrate the power of a device over time with the trapezoidal rule.
+
+    Samples may come at irregular intervals, and samples that are not more
+    recent than the last one are ignored. After the last sample, the power is
+    assumed to stay at its last value.
+    """
 
-    if method is None or method == "wrap":
+    __slots__ = ("start", "time", "power", "joules")
 
-        def _timewrap():
-            t0 = time.time_ns()
-            results = yield
-            t1 = time.time_ns()
-            task = results["task"]
-            if "batch_size" in results:
-                bs = results["batch_size"]
-                if bs is None:
-                    return None
-                seconds = (t1 - t0) / 1_000_000_000
-                return {
-                    "task": task,
-                    "time": seconds,
-                    "batch_size": bs,
-                }
-            elif "batch" in results:
-                data = results["batch"]
-                if data is None:
-                    return None
-                seconds = (t1 - t0) / 1_000_000_000
-                return {
-                    "task": task,
-                    "time": seconds,
-                    "batch_size": batch_size_calc(data),
-                }
-            else:
-                return None
+    def __init__(self):
+        self.start = None
+        self.time = None
+        self.power = 0.0
+        self.joules = 0.0
 
-        times = times_wrap = ov.given.wmap("step", _timewrap).filter(lambda x: x)
+    def add(self, t, power):
+        if self.time is None:
+            self.start = t
+        elif t <= self.time:
+            return
+        else:
+            self.joules += (self.power + power) / 2 * (t - self.time)
+        self.time = t
+        self.power = power
 
-    if method is None:
-        times = times_step | times_wrap
+    def at(self, t):
+        """Return the energy consumed up to time ``t``, in joules."""
+        if self.time is None:
+            return 0.0
+        return self.joules + self.power * (t - self.time)
 
-    grouped_by_task = times.group_by(lambda data: data["task"])
 
-    @grouped_by_task.subscribe
-    def setup_pipeline(times):
-        times = Given(_obs=times)
+@instrument_definition
+def energy(ov):
+    """Compute the energy efficiency of each task, in items per joule.
 
-        # Group by interval
-        if interval_is_time:
-            times = times.buffer_with_time(interval)
-        else:
-            times = times.buffer_with_count(interval)
-
-        if skip:
-            times = times.skip(skip)
-
-        # Compute the final metric
-        @times.subscribe
-        def _(elems):
-            t = 0
-            if sync is not None:
-                t0 = time.time_ns()
-                sync()
-                t1 = time.time_ns()
-                t += (t1 - t0) / 1_000_000_000
-
-            t += sum(e["time"] for e in elems)
-            n = sum(e["batch_size"] for e in elems)
-
-            if n and t:
-                ov.give(rate=n / t, units="items/s", task=elems[0]["task"])
+    This combines the ``gpudata`` given by :func:`~voir.instruments.gpu_monitor`
+    (or :func:`~voir.instruments.monitor_all`) with the ``rate`` given by
+    :func:`~voir.instruments.rate`, so both must be active:
+
+    .. code-block:: python
+
+        def instrument_xyz(ov):
+            yield ov.phases.init
+            ov.require(gpu_monitor(poll_interval=1), rate(interval="10s"), energy())
+
+    The power of each device is integrated over time with the trapezoidal rule.
+    Each time a rate is given for a task, the energy consumed by all devices
+    since the previous rate of that task is given as:
+
+    .. code-block:: python
+
+        give(task=TASK, energy_j=JOULES, watts=AVERAGE_WATTS, items_per_joule=RATE / WATTS)
+
+    Power samples come less often than rates, so the energy after the last
+    sample is estimated by holding its power constant until the next sample
+    comes in. At the end, an ``energy_summary`` event gives the energy, the
+    average power and the duration of the run (from the first to the last
+    power sample), both in total and for each device, as well as the energy,
+    average power, estimated number of items (the rate times the duration of
+    each interval) and ``items_per_joule`` of each task.
+
+    Arguments:
+        ov: The overseer.
+    """
+    devices = {}
+    tasks = {}
+    totals = {}
+
+    def _joules(t):
+        return sum(device.at(t) for device in devices.values())
+
+    def _power(data):
+        t = data.get("time", None)
+        if t is None:
+            t = time.time()
+        for device, info in data["gpudata"].items():
+            power = info.get("power", None)
+            if power is None:
+                continue
+            integral = devices.get(device, None)
+            if integral is None:
+                integral = devices[device] = _Energy()
+            integral.add(t, power)
+
+    def _rate(data):
+        if not devices:
+            return
+        task = data.get("task", None)
+        t = time.time()
+        joules = _joules(t)
+        previous = tasks.get(task, None)
+        tasks[task] = (t, joules)
+        if previous is None:
+            return
+        seconds = t - previous[0]
+        energy_j = joules - previous[1]
+        if seconds <= 0 or energy_j <= 0:
+            return
+        watts = energy_j / seconds
+        ov.give(
+            task=task,
+            energy_j=energy_j,
+            watts=watts,
+            items_per_joule=data["rate"] / watts,
+        )
+        total = totals.get(task, None)
+        if total is None:
+            total = totals[task] = [0.0, 0.0, 0.0]
+        total[0] += energy_j
+        total[1] += seconds
+        total[2] += data["rate"] * seconds
+
+    yield ov.phases.init
+
+    ov.given.where("gpudata") >> _power
+    ov.given.where("rate") >> _rate
+
+    yield ov.phases.finalize
+
+    if not devices:
+        return
+
+    def _entry(energy_j, seconds):
+        return {
+            "energy_j": energy_j,
+            "seconds": seconds,
+            "watts": energy_j / seconds if seconds > 0 else None,
+        }
+
+    start = min(d.start for d in devices.values())
+    end = max(d.time for d in devices.values())
+    ov.log(
+        {
+            "$event": "energy_summary",
+            "$data": {
+                **_entry(sum(d.joules for d in devices.values()), end - start),
+                "devices": {
+                    device: _entry(d.joules, d.time - d.start)
+                    for device, d in devices.items()
+                },
+                "tasks": {
+                    task: {
+                        **_entry(energy_j, seconds),
+                        "items": items,
+                        "items_per_joule": items / energy_j,
+                    }
+                    for task, (energy_j, seconds, items) in totals.items()
+                },
+            },
+        }
+    )
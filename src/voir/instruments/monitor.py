@@ -11,7 +11,13 @@ from .utils import monitor as generic_monitor
 
 
 def monitor(ov, poll_interval=10, worker_init=None, **monitors):
-    """Monitor metrics given by monitors"""
+    """Monitor metrics given by monitors
+
+    The achieved polling rate, the lateness of each poll and the number of polls
+    that were skipped because the previous one ran late are exposed as the
+    ``voir.monitor.sample_rate``, ``voir.monitor.jitter`` and
+    ``voir.monitor.overruns`` metrics.
+    """
 
     yield ov.phases.load_script
 
@@ -37,6 +43,7 @@ def monitor(ov, poll_interval=10, worker_init=None, **monitors):
         push,
         process=False,
         worker_init=worker_init,
+        metrics="voir.monitor",
     )
     mon.start()
     try:
@@ -82,6 +89,9 @@ def gpu_monitor(ov, poll_interval=10, arch=None):
 
         give(task="main", gpudata=DATA)
 
+    The achieved polling rate is exposed as the ``voir.monitor.sample_rate``
+    metric, along with ``voir.monitor.jitter`` and ``voir.monitor.overruns``.
+
     Arguments:
         poll_interval: The polling interval, in seconds. Data will be produced
             every poll_interval seconds.
@@ -2,25 +2,106 @@
 
 import multiprocessing
 import time
-from threading import Thread
+from threading import Event, Thread
 
 
 class Monitor(Thread):
-    """Thread that calls a monitoring function every ``delay`` seconds."""
+    """Thread that calls a monitoring function every ``delay`` seconds.
+
+    Calls are scheduled on absolute deadlines of the monotonic clock, so the
+    time spent in ``func`` does not make the period drift. When a call runs
+    past the next deadline, the ticks that were missed are skipped and counted
+    as overruns, rather than run back to back. :meth:`stop` wakes the thread up
+    immediately.
+
+    Arguments:
+        delay: The period, in seconds.
+        func: The function to call.
+        metrics: If given, the prefix of metrics to expose the schedule with
+            (see :func:`voir.counter`): the achieved sampling rate, in calls
+            per second, as the ``<metrics>.sample_rate`` gauge, the lateness of
+            each call as the ``<metrics>.jitter`` timer, and the missed ticks
+            as the ``<metrics>.overruns`` counter.
+    """
 
-    def __init__(self, delay, func):
+    def __init__(self, delay, func, metrics=None):
         super().__init__(daemon=True)
-        self.stopped = False
         self.delay = delay
         self.func = func
+        self.samples = 0
+        self.overruns = 0
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+        self.start_time = None
+        self._wakeup = Event()
+        if metrics is None:
+            self._metrics = None
+        else:
+            from ..helpers import counter, gauge, timed
+
+            self._metrics = (
+                gauge(f"{metrics}.sample_rate"),
+                timed(f"{metrics}.jitter").timer,
+                counter(f"{metrics}.overruns"),
+            )
+
+    @property
+    def stopped(self):
+        return self._wakeup.is_set()
 
     def run(self):
-        while not self.stopped:
-            time.sleep(self.delay)
+        self.start_time = deadline = time.monotonic()
+        while True:
+            deadline += self.delay
+            now = time.monotonic()
+            while now < deadline:
+                if self._wakeup.wait(deadline - now):
+                    return
+                now = time.monotonic()
+            if self._wakeup.is_set():
+                return
+            self._tick(now - deadline)
             self.func()
+            now = time.monotonic()
+            if now >= deadline + self.delay:
+                # Skip the ticks that were missed instead of bursting
+                missed = int((now - deadline) // self.delay)
+                deadline += missed * self.delay
+                self.overruns += missed
+                if self._metrics is not None:
+                    self._metrics[2].inc(missed)
+
+    def _tick(self, jitter):
+        self.samples += 1
+        self.jitter_total += jitter
+        if jitter > self.jitter_max:
+            self.jitter_max = jitter
+        if self._metrics is not None:
+            sample_rate, timer, _ = self._metrics
+            sample_rate.set(self.sample_rate)
+            timer.record(int(jitter * 1_000_000_000))
+
+    @property
+    def sample_rate(self):
+        """The achieved number of calls per second since the thread started."""
+        if self.start_time is None:
+            return 0.0
+        elapsed = time.monotonic() - self.start_time
+        return self.samples / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        """Return the statistics of the schedule."""
+        return {
+            "samples": self.samples,
+            "overruns": self.overruns,
+            "sample_rate": self.sample_rate,
+            "jitter_mean": self.jitter_total / self.samples if self.samples else 0.0,
+            "jitter_max": self.jitter_max,
+        }
 
     def stop(self):
-        self.stopped = True
+        """Stop calling the function, waking up the thread if it is waiting."""
+        self._wakeup.set()
 
 
 def _worker(state, queue, func, delay, init=None):
@@ -92,7 +173,7 @@ class _Monitor:
             a.stop()
 
 
-def monitor(delay, getfun, pushfun, process=True, worker_init=None):
+def monitor(delay, getfun, pushfun, process=True, worker_init=None, metrics=None):
     """Run the monitor in a different process to have metrics in regular intervals
     Pusher is a thread that gets executed when there is time.
 
@@ -108,6 +189,10 @@ def monitor(delay, getfun, pushfun, process=True, worker_init=None):
 
     process: bool
         If true it will instantiate a new process for the monitoring
+
+    metrics: str
+        Prefix of the metrics that expose the schedule of the monitor, if it
+        runs in a thread (see :class:`Monitor`)
     """
     if process:
         m = []
@@ -124,5 +209,5 @@ def monitor(delay, getfun, pushfun, process=True, worker_init=None):
     def fun():
         pushfun(getfun())
 
-    monitor = Monitor(delay, fun)
+    monitor = Monitor(delay, fun, metrics=metrics)
     return monitor
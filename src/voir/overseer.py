@@ -8,22 +8,90 @@ import json
 import os
 import pkgutil
 import sys
+import threading
+import time
 import traceback
 from argparse import REMAINDER, Namespace
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
-import yaml
 from giving import Given, SourceProxy
-from ptera import Probe, probing, select
 
 from voir.smuggle import SmuggleWriter
 
+from . import startup
 from .argparse_ext import ExtendedArgumentParser
-from .helpers import current_overseer
+from .cli import _voir_arguments
+from .helpers import _metrics, current_overseer, summarize_metrics
 from .phase import GivenOverseer, Phase, PhaseSequence
 from .scriptutils import resolve_script
 
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+if TYPE_CHECKING:  # pragma: no cover
+    from ptera import Probe
+
+
+def _clock():
+    """Measure the current time, CPU time and peak memory of the process.
+
+    ``maxrss`` is the peak resident set size in bytes, or None if the
+    platform does not provide it.
+    """
+    if resource is None:  # pragma: no cover
+        maxrss = None
+    else:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != "darwin":
+            # Linux reports this in kilobytes, macOS in bytes
+            maxrss *= 1024
+    return {
+        "time": time.time(),
+        "perf_counter_ns": time.perf_counter_ns(),
+        "cpu_time": time.process_time(),
+        "maxrss": maxrss,
+    }
+
+
+# Two-sided 95% critical values of Student's t distribution, by degrees of freedom
+_t95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]  # fmt: skip
+
+
+def summarize_times(times):
+    """Compute the mean of a list of times, with a 95% confidence interval.
+
+    Returns:
+        A dictionary with the ``times`` themselves, their ``mean``, ``std``,
+        ``min`` and ``max``, and ``ci95``, the bounds of the 95% confidence
+        interval of the mean (Student's t). ``std`` and ``ci95`` are None if
+        there is a single time.
+    """
+    n = len(times)
+    mean = sum(times) / n
+    if n > 1:
+        std = (sum((t - mean) ** 2 for t in times) / (n - 1)) ** 0.5
+        t = _t95[n - 2] if n - 2 < len(_t95) else 1.96
+        half = t * std / n**0.5
+        ci95 = [mean - half, mean + half]
+    else:
+        std = ci95 = None
+    return {
+        "times": list(times),
+        "mean": mean,
+        "std": std,
+        "min": min(times),
+        "max": max(times),
+        "ci95": ci95,
+    }
+
 
 class JsonlFileLogger:
     """Log data to a file as JSON lines.
@@ -34,10 +102,19 @@ class JsonlFileLogger:
         require_writable: Require the file descriptor to be writable. If this is
             False and the file is not writable, this logger will simply forward
             the data to /dev/null instead of raising an OSError.
+        compact: If True, dictionaries are written as positional rows. The first
+            time a given key layout is seen, a ``{"$schema": ID, "$keys": KEYS}``
+            record is written, and then each dictionary with that layout is
+            written as ``[ID, *values]``. :class:`voir.proc.Multiplexer`
+            reconstructs the original dictionaries transparently.
     """
 
-    def __init__(self, filename, require_writable=True):
+    def __init__(self, filename, require_writable=True, compact=False):
         self.filename = filename
+        self.compact = compact
+        self.schemas = {}
+        # Data may be logged from the drain thread as well as the main thread
+        self._lock = threading.Lock()
         if self.filename == 1:
             self.out = SmuggleWriter(sys.stdout)
         elif self.filename == 2:
@@ -58,14 +135,36 @@ class JsonlFileLogger:
         ``{"$unserializable": repr(data)}``, and if _that_ fails, it will be
         dumped as the singularly uninformative ``{"$unrepresentable": None}``.
         """
+        with self._lock:
+            if self.compact and isinstance(data, dict) and self._log_compact(data):
+                return
+            try:
+                txt = json.dumps(data)
+            except TypeError:
+                try:
+                    txt = json.dumps({"$unserializable": repr(data)})
+                except Exception:
+                    txt = json.dumps({"$unrepresentable": None})
+            self.out.write(f"{txt}\n")
+
+    def _log_compact(self, data):
+        keys = tuple(data)
+        sid = self.schemas.get(keys)
+        new_schema = sid is None
+        if new_schema:
+            if not all(isinstance(k, str) for k in keys):
+                return False
+            sid = len(self.schemas)
         try:
-            txt = json.dumps(data)
+            txt = json.dumps([sid, *data.values()])
         except TypeError:
-            try:
-                txt = json.dumps({"$unserializable": repr(data)})
-            except Exception:
-                txt = json.dumps({"$unrepresentable": None})
+            return False
+        if new_schema:
+            self.schemas[keys] = sid
+            schema = json.dumps({"$schema": sid, "$keys": keys})
+            self.out.write(f"{schema}\n")
         self.out.write(f"{txt}\n")
+        return True
 
     def close(self):
         """Close the file."""
@@ -93,6 +192,8 @@ class ProbeInstrument:
     """
 
     def __init__(self, selector, **kwargs):
+        from ptera import probing
+
         self.selector = selector
         self.probe = self.__state__ = probing(self.selector, **kwargs)
 
@@ -139,12 +240,31 @@ class Overseer(GivenOverseer):
     logfile: Union[str, int]
     """The name of the file to log to, or an integer file descriptor."""
 
-    def __init__(self, instruments, logfile=None):
+    def __init__(
+        self,
+        instruments,
+        logfile=None,
+        compact_log=False,
+        drain_interval=None,
+        profile=False,
+        metrics_interval=10,
+    ):
         """Initialize an Overseer.
 
         Arguments:
             instruments: Collection of instruments to require.
             logfile: Filename to log to, or integer file descriptor.
+            compact_log: Write the logfile using the compact encoding of
+                :class:`JsonlFileLogger`.
+            drain_interval: Maximal delay, in seconds, before data given from
+                other threads is pushed into :attr:`given`. If None, that data
+                is only pushed when the main thread gives something.
+            profile: Measure the time spent in each instrument and log it as an
+                ``instrument_overhead`` event at the end (equivalent to the
+                ``--voir-profile`` flag).
+            metrics_interval: Interval, in seconds, at which the summaries of
+                :func:`~voir.helpers.counter`, :func:`~voir.helpers.gauge` and
+                :func:`~voir.helpers.histogram` are logged, if any are used.
         """
         self.argparser = ExtendedArgumentParser()
         self.argparser.add_argument("SCRIPT", nargs="?", help="The script to run")
@@ -157,16 +277,45 @@ class Overseer(GivenOverseer):
             nargs=REMAINDER,
             help="Module or module:function to run",
         )
+        self.argparser.add_argument(
+            "--voir-profile",
+            action="store_true",
+            help="Log the time spent in each instrument",
+        )
+        self.argparser.add_argument(
+            "--repeat",
+            type=int,
+            default=1,
+            metavar="N",
+            help="Run the main section of the script N times",
+        )
+        self.argparser.add_argument(
+            "--warmup",
+            type=int,
+            default=0,
+            metavar="K",
+            help="Run the main section K more times before --repeat, untimed",
+        )
 
         super().__init__(
             phase_names=["init", "parse_args", "load_script", "run_script", "finalize"],
             args=(self,),
             kwargs={},
+            drain_interval=drain_interval,
         )
+        if profile or startup.startup_profile is not None:
+            self.enable_overhead_accounting()
+        # Accounting only serves to break down the startup, so it is disabled
+        # when the script starts running, unless --voir-profile is given
+        self._account_startup_only = not profile
         self.require(*instruments)
         self.logfile = logfile
+        self.compact_log = compact_log
+        self.metrics_interval = metrics_interval
+        self._metrics_monitor = None
+        self.iteration = None
 
-    def probe(self, selector: str, **kwargs) -> Probe:
+    def probe(self, selector: str, **kwargs) -> "Probe":
         """Create a :class:`ProbeInstrument` on the given selector.
 
         >>> probe = overseer.probe("f > x")
@@ -175,8 +324,11 @@ class Overseer(GivenOverseer):
         Arguments:
             selector: The selector to probe.
         """
+        from ptera import select
+
         return self.require(ProbeInstrument(select(selector, skip_frames=1), **kwargs))
 
+    @contextmanager
     def run_phase(self, phase: Phase):
         """Context manager to run a phase.
 
@@ -187,11 +339,40 @@ class Overseer(GivenOverseer):
         yielded that phase (in order to wait for its end) are resumed, in
         priority order.
 
+        A ``phase`` event is logged when the phase starts and a ``phase_end``
+        event is logged once the instruments are done with it. Both contain the
+        wall clock ``time``, ``perf_counter_ns``, the process' ``cpu_time`` and
+        its peak resident memory (``maxrss``, in bytes). ``phase_end`` also
+        contains the ``duration`` and ``cpu_duration`` of the phase, in seconds.
+
         Arguments:
             phase: The phase to run.
         """
-        self.log({"$event": "phase", "$data": {"name": phase.name}})
-        return super().run_phase(phase)
+        start = _clock()
+        self.log({"$event": "phase", "$data": {"name": phase.name, **start}})
+        try:
+            with super().run_phase(phase) as set_value:
+                yield set_value
+        finally:
+            end = _clock()
+            if startup.startup_profile is not None:
+                startup.startup_profile.add(
+                    "phases",
+                    phase.name,
+                    end["perf_counter_ns"] - start["perf_counter_ns"],
+                )
+            self.log(
+                {
+                    "$event": "phase_end",
+                    "$data": {
+                        "name": phase.name,
+                        **end,
+                        "duration": (end["perf_counter_ns"] - start["perf_counter_ns"])
+                        / 1_000_000_000,
+                        "cpu_duration": end["cpu_time"] - start["cpu_time"],
+                    },
+                }
+            )
 
     ####################
     # Internal methods #
@@ -218,8 +399,10 @@ class Overseer(GivenOverseer):
         self.log = LogStream()
         self.given.where("$event") >> self.log
         if self.logfile is not None:
-            self._logger = JsonlFileLogger(self.logfile, require_writable=False)
-            self.log >> self._logger.log
+            self._logger = JsonlFileLogger(
+                self.logfile, require_writable=False, compact=self.compact_log
+            )
+            self.log >> self._log_to_file
         else:
             self._logger = None
 
@@ -227,23 +410,137 @@ class Overseer(GivenOverseer):
             tmp_argparser = ExtendedArgumentParser(add_help=False)
             tmp_argparser.add_argument("--config", action="append", default=[])
             tmp_options, argv = tmp_argparser.parse_known_args(argv)
+            # Checked before parse_args so that the init phase is accounted, but
+            # only before SCRIPT, as the arguments of the script may include it
+            if "--voir-profile" in _voir_arguments(argv):
+                self.enable_overhead_accounting()
+                self._account_startup_only = False
+            if tmp_options.config:
+                import yaml
+
             for config in tmp_options.config:
                 self.argparser.merge_base_config(yaml.safe_load(open(config, "r")))
 
         with self.run_phase(self.phases.parse_args):
             self.options = self.argparser.parse_args(argv)
+            if self.options.repeat < 1 or self.options.warmup < 0:
+                self.argparser.error(
+                    "--repeat must be at least 1 and --warmup cannot be negative"
+                )
             del self.argparser
 
         with self.run_phase(self.phases.load_script):
             script, argv, func = _resolve_function(self.options)
 
+        self._log_startup_profile()
+
         with self.run_phase(self.phases.run_script) as set_value:
+            set_value(self._run_script(script, argv, func))
+
+    def _run_script(self, script, argv, func):
+        """Run the main section of the script, repeatedly if requested.
+
+        With ``--repeat N --warmup K``, the main section runs ``K + N`` times
+        in the same process. Each run is bracketed by ``iteration`` and
+        ``iteration_end`` events, every logged event is tagged with the
+        ``$iteration`` index, and a ``repeat_summary`` event with the
+        statistics of the ``N`` timed iterations is logged at the end.
+        """
+        repeat, warmup = self.options.repeat, self.options.warmup
+        if repeat == 1 and warmup == 0:
             sys.argv = [script, *argv]
-            set_value(func())
+            return func()
+
+        times = []
+        try:
+            for i in range(warmup + repeat):
+                is_warmup = i < warmup
+                self.iteration = i
+                self.log(
+                    {
+                        "$event": "iteration",
+                        "$data": {"index": i, "warmup": is_warmup},
+                    }
+                )
+                start = _clock()
+                sys.argv = [script, *argv]
+                try:
+                    result = func()
+                finally:
+                    end = _clock()
+                    duration = (
+                        end["perf_counter_ns"] - start["perf_counter_ns"]
+                    ) / 1_000_000_000
+                    self.log(
+                        {
+                            "$event": "iteration_end",
+                            "$data": {
+                                "index": i,
+                                "warmup": is_warmup,
+                                "duration": duration,
+                                "cpu_duration": end["cpu_time"] - start["cpu_time"],
+                            },
+                        }
+                    )
+                if not is_warmup:
+                    times.append(duration)
+        finally:
+            self.iteration = None
+            if times:
+                self.log(
+                    {
+                        "$event": "repeat_summary",
+                        "$data": {
+                            "warmup": warmup,
+                            "repeat": len(times),
+                            **summarize_times(times),
+                        },
+                    }
+                )
+        return result
+
+    def _log_to_file(self, data):
+        if self.iteration is not None and isinstance(data, dict):
+            data = {**data, "$iteration": self.iteration}
+        self._logger.log(data)
+
+    def _log_startup_profile(self):
+        """Log the ``startup_profile`` event, if ``VOIR_PROFILE_STARTUP`` is set."""
+        profile = startup.startup_profile
+        if profile is None:
+            return
+        for name, times in (self.overhead or {}).items():
+            profile.add("instruments", name, sum(times.values()))
+        if self._account_startup_only:
+            self.disable_overhead_accounting()
+        summary = profile.summary()
+        self.log({"$event": "startup_profile", "$data": summary})
+        print(profile.format(summary), file=sys.stderr)
+
+    def _flush_metrics(self):
+        summaries = summarize_metrics()
+        if summaries:
+            self.give(**{"$event": "metrics", "$data": summaries})
+
+    def _watch_metrics(self):
+        """Start logging metrics periodically, if not already done."""
+        if self._metrics_monitor is None and self.status == "running":
+            from .instruments.utils import Monitor
+
+            self._metrics_monitor = Monitor(self.metrics_interval, self._flush_metrics)
+            self._metrics_monitor.start()
+
+    def _callback_sources(self):
+        sources = super()._callback_sources()
+        log = getattr(self, "log", None)
+        return sources if log is None else [*sources, log]
 
     def _prepare(self):
-        super()._prepare()
+        # Set before the drain thread copies the context in super()._prepare()
         self._token = current_overseer.set(self)
+        super()._prepare()
+        if _metrics:
+            self._watch_metrics()
 
     def _on_error(self, e):
         self.log(
@@ -254,9 +551,43 @@ class Overseer(GivenOverseer):
         )
 
     def _finish(self):
+        if self._metrics_monitor is not None:
+            self._metrics_monitor.stop()
         super()._finish()
+        if self._metrics_monitor is not None and (summaries := summarize_metrics()):
+            self.log({"$event": "metrics", "$data": summaries})
+        # Metrics belong to this run
+        _metrics.clear()
+        stats = self.queue_stats
+        if stats["drained"]:
+            self.log(
+                {
+                    "$event": "queue_stats",
+                    "$data": {
+                        "drained": stats["drained"],
+                        "max_depth": stats["max_depth"],
+                        "mean_wait": stats["total_wait"] / stats["drained"],
+                        "max_wait": stats["max_wait"],
+                    },
+                }
+            )
         with self.run_phase(self.phases.finalize):
             pass
+        if self.overhead is not None:
+            self.log(
+                {
+                    "$event": "instrument_overhead",
+                    "$data": {
+                        name: {
+                            "total": sum(times.values()) / 1_000_000_000,
+                            "phases": {
+                                phase: t / 1_000_000_000 for phase, t in times.items()
+                            },
+                        }
+                        for name, times in self.overhead.items()
+                    },
+                }
+            )
         if self._logger:
             self._logger.close()
         current_overseer.reset(self._token)
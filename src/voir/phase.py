@@ -5,6 +5,8 @@ Overseer is based on functionality in this file.
 
 from __future__ import annotations
 
+import asyncio
+import contextvars
 import heapq
 import inspect
 import threading
@@ -13,7 +15,7 @@ from contextlib import contextmanager
 from itertools import count
 from queue import Empty, Queue
 
-from giving import give, given
+from giving import Given, give
 
 _gid = count()
 
@@ -125,6 +127,12 @@ class BaseOverseer:
         self.handler_kwargs = kwargs
         self.status = "init"
         self._to_require = []
+        self._names = {}
+        self._phase_name = "_boot"
+        self._local = threading.local()
+        self._loop = None
+        self._loop_thread = None
+        self.overhead = None
 
     def _require(self, func):
         """Add a new handler.
@@ -137,6 +145,10 @@ class BaseOverseer:
         for all phases that are already done, and then queued for the next phase
         that is either currently processed or to be processed in the future.
 
+        If it returns an async generator, it is run on an event loop thread that
+        is shared by all async instruments, but it is otherwise scheduled like
+        a normal generator: each of its steps is waited for.
+
         Any errors in the handler are passed to ``self._on_instrument_error``.
 
         Arguments:
@@ -152,9 +164,10 @@ class BaseOverseer:
             return state
 
         self.handlers.add(func)
+        name = _instrument_name(func)
 
         try:
-            gen = func(*self.handler_args, **self.handler_kwargs)
+            gen = self._account(name, func, *self.handler_args, **self.handler_kwargs)
         except StopProgram as stp:
             self._on_stop(*stp.args)
             raise
@@ -162,10 +175,15 @@ class BaseOverseer:
             self._on_instrument_error(exc)
             return
 
+        if inspect.isasyncgen(gen):
+            gen = _drive_async_generator(gen, self._event_loop())
+
         if not inspect.isgenerator(gen):
             return state
 
-        self._step((0, next(_gid), gen, self.phases._boot))
+        gid = next(_gid)
+        self._names[gid] = name
+        self._step((0, gid, gen, self.phases._boot))
         return state
 
     def require(self, *instruments):
@@ -177,6 +195,9 @@ class BaseOverseer:
         for all phases that are already done, and then queued for the next phase
         that is either currently processed or to be processed in the future.
 
+        Instruments may also be async generator functions, in which case they
+        run on an event loop thread shared by all async instruments.
+
         Arguments:
             instruments: Callables or generator functions.
         """
@@ -206,9 +227,86 @@ class BaseOverseer:
         """
         raise OverseerAbort(exc)
 
+    def enable_overhead_accounting(self):
+        """Start measuring the time spent in each instrument.
+
+        Once enabled, ``self.overhead`` maps the name of each instrument to a
+        dictionary from phase name to the number of nanoseconds spent in the
+        instrument during that phase. This includes the instrument's generator
+        steps as well as the callbacks it subscribed to the streams returned by
+        ``self._callback_sources()``. Time spent in a nested instrument is not
+        counted in the instrument that triggered it.
+        """
+        if self.overhead is None:
+            self.overhead = {}
+
+    def disable_overhead_accounting(self):
+        """Stop measuring the time spent in each instrument.
+
+        ``self.overhead`` is reset to None, and the callbacks stop being timed.
+        """
+        self.overhead = None
+        for src in self._callback_sources():
+            observers = src._observers
+            for i, observer in enumerate(observers):
+                if isinstance(observer, _AccountedObserver):
+                    observers[i] = observer.observer
+
+    def _callback_sources(self):
+        return []
+
+    def _account(self, name, fn, /, *args, **kwargs):
+        """Call ``fn(*args, **kwargs)``, attributing the time spent to ``name``."""
+        if self.overhead is None:
+            return fn(*args, **kwargs)
+
+        sources = [(src, len(src._observers)) for src in self._callback_sources()]
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0)
+        t0 = time.perf_counter_ns()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter_ns() - t0
+            own = elapsed - stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            times = self.overhead.setdefault(name, {})
+            times[self._phase_name] = times.get(self._phase_name, 0) + own
+            # Subscriptions made by fn will be accounted to the same name
+            for src, n in sources:
+                observers = src._observers
+                for i in range(n, len(observers)):
+                    if not isinstance(observers[i], _AccountedObserver):
+                        observers[i] = _AccountedObserver(self, name, observers[i])
+
+    def _event_loop(self):
+        """Return the event loop that runs async instruments, starting it if needed."""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(
+                target=self._loop.run_forever, daemon=True
+            )
+            self._loop_thread.start()
+        return self._loop
+
+    def _close_event_loop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(_cancel_tasks(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = self._loop_thread = None
+
     def _on_instrument_error(self, e):
         pass
 
+    def _raise_pending(self):
+        pass
+
     def _on_stop(self, value):
         self.status = "stopped"
         for entries in self.plan.values():
@@ -227,8 +325,11 @@ class BaseOverseer:
             entry: A (priority, gid, generator, requested_phase) tuple.
         """
         _, gid, gen, next_phase = entry
+        name = self._names.get(gid)
         while True:
-            next_phase, next_priority = self._step_one(gen, next_phase)
+            next_phase, next_priority = self._account(
+                name, self._step_one, gen, next_phase
+            )
             if next_phase is None:
                 return
             elif not next_phase.done:
@@ -280,6 +381,7 @@ class BaseOverseer:
             phase: One of the Phases in ``self.phases``.
         """
         result = exception = None
+        self._phase_name = phase.name
 
         def _set_value(value):
             nonlocal result
@@ -287,6 +389,7 @@ class BaseOverseer:
 
         try:
             yield _set_value
+            self._raise_pending()
         except BaseException as exc:
             exception = exc
 
@@ -335,13 +438,200 @@ class BaseOverseer:
             self._on_error(e)
             raise
         finally:
-            self._finish()
+            try:
+                self._finish()
+            finally:
+                self._close_event_loop()
+
+
+def _drive_async_generator(agen, loop):
+    """Wrap an async generator into a generator that runs its steps on ``loop``."""
+
+    def run(coro):
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    try:
+        phase = run(agen.__anext__())
+        while True:
+            try:
+                value = yield phase
+            except GeneratorExit:
+                if not loop.is_closed():
+                    run(agen.aclose())
+                raise
+            except BaseException as exc:
+                phase = run(agen.athrow(exc))
+            else:
+                phase = run(agen.asend(value))
+    except StopAsyncIteration:
+        return
+
+
+async def _cancel_tasks():
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.get_running_loop().shutdown_asyncgens()
+
+
+def _instrument_name(func):
+    return getattr(func, "__qualname__", None) or type(func).__qualname__
+
+
+class _AccountedObserver:
+    """Wrap an observer to account the time it takes to the overseer."""
+
+    def __init__(self, overseer, name, observer):
+        self.overseer = overseer
+        self.name = name
+        self.observer = observer
+
+    def on_next(self, value):
+        self.overseer._account(self.name, self.observer.on_next, value)
+
+    def on_error(self, error):
+        self.observer.on_error(error)
+
+    def on_completed(self):
+        self.overseer._account(self.name, self.observer.on_completed)
+
+
+# Keys of the data that voir.iterate gives for each step
+_step_keys = frozenset(
+    {"task", "progress", "data_wait", "batch", "batch_size", "$wrap"}
+)
+
+
+def _selected_keys(keys, conditions=()):
+    """Return the keys that a where/getitem/keep operation requires."""
+    keys = [k.lstrip("?") for k in keys if isinstance(k, str)]
+    return {k for k in keys if not k.startswith("!")} | set(conditions)
+
+
+class _OverseerGiven(Given):
+    """Given for a GivenOverseer.
+
+    If a lock is given, pushes are serialized with it, so that other threads
+    can push. Before each push from the main thread, the errors that the
+    callbacks raised on the drain thread are raised (see
+    :meth:`GivenOverseer._drain`).
+
+    The root stream also tracks in ``listens_to_steps`` whether anything may
+    listen to the data given by :func:`voir.iterate` for each step, so that
+    ``iterate`` can skip it otherwise. A subscription is assumed to listen
+    unless the stream was narrowed down to keys that ``iterate`` does not
+    give, with e.g. ``where("$event")``, or to a ``wrap`` that is not
+    ``"step"``.
+    """
+
+    _selective = False
+
+    def __init__(self, lock=None, overseer=None, **kwargs):
+        self._lock = lock
+        self._overseer = overseer
+        super().__init__(**kwargs)
+        if self._root is self:
+            self.listens_to_steps = False
+
+    def _push(self, data):
+        overseer = self._overseer
+        if overseer is not None and threading.current_thread() is overseer._thread:
+            overseer._raise_pending()
+        if self._lock is None:
+            super()._push(data)
+        else:
+            with self._lock:
+                super()._push(data)
+
+    def _copy(self, new_obs):
+        result = super()._copy(new_obs)
+        result._selective = self._selective
+        return result
+
+    def _narrow(self, result, selected):
+        if selected & _step_keys:
+            self._root.listens_to_steps = True
+        if selected:
+            result._selective = True
+        return result
+
+    def _quiet(self):
+        """Return a copy of this stream whose subscriptions do not listen to steps."""
+        result = self._copy(self._obs)
+        result._selective = True
+        return result
+
+    def subscribe(self, *args, **kwargs):
+        if not self._selective:
+            self._root.listens_to_steps = True
+        return super().subscribe(*args, **kwargs)
+
+    def where(self, *keys, **conditions):
+        return self._narrow(
+            super().where(*keys, **conditions), _selected_keys(keys, conditions)
+        )
+
+    def where_any(self, *keys):
+        return self._narrow(super().where_any(*keys), _selected_keys(keys))
+
+    def getitem(self, *keys, strict=False):
+        return self._narrow(super().getitem(*keys, strict=strict), _selected_keys(keys))
+
+    def keep(self, *keys, **remap):
+        return self._narrow(
+            super().keep(*keys, **remap), _selected_keys(keys, remap.values())
+        )
+
+    def wrap(self, name, fn=None, pass_keys=False, return_function=False):
+        if isinstance(name, str) and name != "step":
+            return super(_OverseerGiven, self._quiet()).wrap(
+                name, fn, pass_keys=pass_keys, return_function=return_function
+            )
+        return super().wrap(
+            name, fn, pass_keys=pass_keys, return_function=return_function
+        )
+
+    def wmap(self, name, fn=None, pass_keys=True):
+        result = super().wmap(name, fn, pass_keys=pass_keys)
+        if name == "step":
+            self._root.listens_to_steps = True
+        result._selective = True
+        return result
+
+
+class _QueueDrainer(threading.Thread):
+    """Thread that periodically flushes the queue of a GivenOverseer."""
+
+    def __init__(self, overseer, interval):
+        super().__init__(daemon=True)
+        self.overseer = overseer
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.overseer._context.run(self.overseer._drain)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
 
 
 class GivenOverseer(BaseOverseer):
-    """Phase runner that provides an interface to giving.give."""
+    """Phase runner that provides an interface to giving.give.
 
-    def __init__(self, phase_names, args=(), kwargs={}):
+    Arguments:
+        phase_names: The names of the phases.
+        args: Positional arguments to give to each handler.
+        kwargs: Keyword arguments to give to each handler.
+        drain_interval: If not None, a thread will push data queued from
+            other threads into ``self.given`` every ``drain_interval`` seconds,
+            even if the main thread gives nothing. Pushes into ``self.given``
+            are then serialized with a lock.
+    """
+
+    def __init__(self, phase_names, args=(), kwargs={}, drain_interval=None):
         super().__init__(
             phase_names=phase_names,
             args=args,
@@ -350,6 +640,17 @@ class GivenOverseer(BaseOverseer):
         self._queue = Queue()
         self._thread = threading.current_thread()
         self._queue_called = False
+        self._lock = threading.RLock()
+        self._drainer = None
+        self._context = None
+        self._pending_error = None
+        self.drain_interval = drain_interval
+        self.queue_stats = {
+            "drained": 0,
+            "max_depth": 0,
+            "total_wait": 0,
+            "max_wait": 0,
+        }
 
     def give(self, **data):
         """Push data into the self.given stream.
@@ -362,19 +663,57 @@ class GivenOverseer(BaseOverseer):
         else:
             self.queue(**data)
 
-    def _dump_queue(self):
+    def _dump_queue(self, push=None):
         if self._queue_called:
+            push = push or (lambda data: give(**data))
+            stats = self.queue_stats
+            depth = self._queue.qsize()
+            stats["max_depth"] = max(stats["max_depth"], depth)
             while True:
                 try:
-                    data = self._queue.get_nowait()
-                    give(**data)
+                    queued, data = self._queue.get_nowait()
                 except Empty:
                     break
+                wait = time.perf_counter() - queued
+                stats["drained"] += 1
+                stats["total_wait"] += wait
+                stats["max_wait"] = max(stats["max_wait"], wait)
+                push(data)
+
+    def _callback_sources(self):
+        given = getattr(self, "given", None)
+        return [] if given is None else [given]
+
+    def _drain(self):
+        """Push queued data into ``self.given`` from a thread other than the main one.
+
+        This runs in a copy of the main thread's context, so that callbacks can
+        give data. A :class:`StopProgram` or :class:`OverseerAbort` raised by a
+        callback is raised in the main thread the next time it gives data or
+        finishes a phase. Other errors go to the instrument error handler.
+        """
+        with self._lock:
+            self._dump_queue(push=self._drain_push)
+
+    def _drain_push(self, data):
+        try:
+            self.given._push(data)
+        except (StopProgram, OverseerAbort) as exc:
+            if self._pending_error is None:
+                self._pending_error = exc
+        except BaseException as exc:
+            self._on_instrument_error(exc)
+
+    def _raise_pending(self):
+        exc = self._pending_error
+        if exc is not None:
+            self._pending_error = None
+            raise exc
 
     def queue(self, **data):
         """Give data into a queue, typically from other threads."""
         if not self._queue_called:
-            qd = self.given.where("!$queued")
+            qd = self.given._quiet().where("!$queued")
 
             @qd.subscribe
             def _(_):
@@ -385,13 +724,21 @@ class GivenOverseer(BaseOverseer):
         self._queue_called = True
 
         data["$queued"] = time.time()
-        self._queue.put(data)
+        self._queue.put((time.perf_counter(), data))
 
     def _prepare(self):
         super()._prepare()
-        self.given = given().__enter__()
+        if self.drain_interval is None:
+            self.given = _OverseerGiven().__enter__()
+        else:
+            self.given = _OverseerGiven(lock=self._lock, overseer=self).__enter__()
+            self._context = contextvars.copy_context()
+            self._drainer = _QueueDrainer(self, self.drain_interval)
+            self._drainer.start()
 
     def _finish(self):
+        if self._drainer is not None:
+            self._drainer.stop()
         self._dump_queue()
         self.given.__exit__(None, None, None)
         super()._finish()
@@ -13,7 +13,7 @@ import os
 import select
 import subprocess
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Callable
 
 from voir.smuggle import Decoder, MultimodalFile
@@ -24,6 +24,7 @@ class _Stream:
     pipe: object
     info: dict
     deserializer: Callable = None
+    schemas: dict = field(default_factory=dict)
 
 
 @dataclass
@@ -101,7 +102,16 @@ class Multiplexer:
         self.constructor = constructor or LogEntry
         self.buffer = []
 
-    def start(self, argv, info, env=None, use_stdout=False, buffered=True, **options):
+    def start(
+        self,
+        argv,
+        info,
+        env=None,
+        use_stdout=False,
+        buffered=True,
+        compact=False,
+        **options,
+    ):
         """Start a process from the given ``argv``.
 
         Arguments:
@@ -118,6 +128,10 @@ class Multiplexer:
                 transparently. See :mod:`voir.smuggle`.
             buffered: use to disable python output buffering.
                 This is used to make test deterministic as buffering can cut lines are different spots.
+            compact: If True, set the ``DATA_COMPACT`` environment variable so that
+                ``voir`` writes its data using schema records and positional rows
+                (see :class:`voir.overseer.JsonlFileLogger`). The rows are decoded
+                back into dictionaries transparently.
 
         Returns:
             The subprocess object.
@@ -125,6 +139,8 @@ class Multiplexer:
         env = os.environ if env is None else env
         r, w = None, None
         buffered = "1" if buffered else "0"
+        if compact:
+            env = {**env, "DATA_COMPACT": "1"}
 
         if use_stdout:
             proc = subprocess.Popen(
@@ -199,6 +215,14 @@ class Multiplexer:
             if s.deserializer:
                 try:
                     data = s.deserializer(line)
+                    # Arrays are only rows once the stream has given a schema,
+                    # so that other JSON data goes through as is
+                    if isinstance(data, list) and s.schemas:
+                        sid, *values = data
+                        data = dict(zip(s.schemas[sid], values))
+                    elif isinstance(data, dict) and data.keys() == {"$schema", "$keys"}:
+                        s.schemas[data["$schema"]] = data["$keys"]
+                        return
                     if "$event" in data:
                         yield self.constructor(
                             event=data.pop("$event"),
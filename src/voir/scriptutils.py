@@ -5,11 +5,21 @@ to do here.
 """
 
 import ast
+import hashlib
 import io
+import marshal
+import os
 import sys
 from importlib.machinery import ModuleSpec
+from importlib.util import MAGIC_NUMBER, cache_from_source
 from types import ModuleType
 
+from . import startup
+
+# Bump this whenever the way split_script cuts the module changes, so that
+# stale cache entries are not reused.
+SPLIT_VERSION = 1
+
 
 def resolve_script(script, module_name=None):
     """Return a function that calculates the main body of the script.
@@ -26,18 +36,20 @@ def resolve_script(script, module_name=None):
     Returns:
         A nullary function that executes the script.
     """
-    prep, mainsection = split_script(script)
+    with startup.measure("script", "split"):
+        prep, mainsection = split_script(script)
     mod = ModuleType("__main__")
     glb = vars(mod)
     glb["__file__"] = script
     if module_name:
         glb["__spec__"] = ModuleSpec(name=module_name, loader=None)
     sys.modules["__main__"] = mod
-    exec(prep, glb, glb)
+    with startup.measure("script", "prelude"):
+        exec(prep, glb, glb)
     return lambda: exec(mainsection, glb, glb)
 
 
-def split_script(script):
+def split_script(script, cache=True):
     """Split code that comes after all function definitions.
 
     Essentially, we want to be able to instrument functions in the main script, which
@@ -48,8 +60,15 @@ def split_script(script):
     Code between function definitions will be evaluated right away, but the bulk usually
     comes after these definitions (because they need to use them).
 
+    The compiled code objects are cached on disk next to the script, in a
+    ``__pycache__`` directory, much like Python does for imported modules. The
+    cache entry is keyed on the hash of the source, the Python version and
+    :data:`SPLIT_VERSION`.
+
     Arguments:
         script: Path to the script.
+        cache: Whether to read and write the bytecode cache. Writing is also
+            disabled when ``sys.dont_write_bytecode`` is set.
 
     Returns:
         A ``(prepare, run)`` tuple such that:
@@ -62,6 +81,23 @@ def split_script(script):
     with io.open_code(script) as f:
         source_code = f.read()
 
+    if not cache:
+        return _split_source(source_code, script)
+
+    key = _cache_key(source_code, script)
+    cache_path = _cache_path(script)
+    if cache_path is None:
+        return _split_source(source_code, script)
+
+    codes = _read_cache(cache_path, key)
+    if codes is None:
+        codes = _split_source(source_code, script)
+        if not sys.dont_write_bytecode:
+            _write_cache(cache_path, key, codes)
+    return codes
+
+
+def _split_source(source_code, script):
     tree = ast.parse(source_code, mode="exec")
 
     last_def = 0
@@ -89,3 +125,55 @@ def split_script(script):
         compile(mod_before, script, "exec"),
         compile(mod_after, script, "exec"),
     )
+
+
+def _cache_key(source_code, script):
+    h = hashlib.sha256(source_code)
+    # The filename is baked into the code objects, so it is part of the key
+    h.update(os.fsencode(script))
+    # So is the optimization level (python -O strips asserts)
+    h.update(sys.flags.optimize.to_bytes(4, "little"))
+    return MAGIC_NUMBER + SPLIT_VERSION.to_bytes(4, "little") + h.digest()
+
+
+def _cache_path(script):
+    if not script.endswith(".py"):
+        script += ".py"
+    try:
+        # Separate files, so that -O and normal runs do not overwrite each other
+        optimize = sys.flags.optimize
+        tag = f"voiropt{optimize}" if optimize else "voir"
+        return cache_from_source(script, optimization=tag)
+    except NotImplementedError:  # pragma: no cover
+        # sys.implementation.cache_tag is None
+        return None
+
+
+def _read_cache(cache_path, key):
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(key):
+        return None
+    try:
+        prep, run = marshal.loads(data[len(key) :])
+    except (EOFError, ValueError, TypeError):
+        return None
+    return prep, run
+
+
+def _write_cache(cache_path, key, codes):
+    tmp = f"{cache_path}.{os.getpid()}"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(key + marshal.dumps(codes))
+        os.replace(tmp, cache_path)
+    except OSError:
+        # Read-only directories and the like: we simply do not cache
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
@@ -0,0 +1,372 @@
+"""Run voir from a pre-forked server to avoid paying for imports on each launch.
+
+``voir serve --socket PATH --preload torch`` imports voir and the preloaded
+modules once, then waits for requests on a Unix socket. Each request is served
+by a fresh child process forked from the server, which runs the usual
+:class:`~voir.overseer.Overseer` pipeline.
+
+When ``VOIR_SERVER=PATH`` is set, the ``voir`` command acts as a client: it
+sends its arguments, environment and working directory to the server, along
+with its stdin, stdout, stderr and ``DATA_FD`` file descriptors, so that the
+child writes directly into them. The client exits with the child's return code.
+
+Forking only works reliably when the server holds no threads and no state that
+does not survive a fork (e.g. an initialized CUDA context), so the server
+checks for these after preloading and refuses to start if it finds any.
+"""
+
+import argparse
+import array
+import json
+import os
+import selectors
+import signal
+import socket
+import stat
+import struct
+import sys
+import threading
+import traceback
+
+_header = struct.Struct("!Q")
+_maxfds = 8
+
+
+def _send_request(sock, payload, fds):
+    data = json.dumps(payload).encode("utf8")
+    sock.sendmsg(
+        [_header.pack(len(data))],
+        [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))],
+    )
+    sock.sendall(data)
+
+
+def _recv_exactly(sock, n):
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise EOFError("Connection closed before the request was received")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_request(sock):
+    fds = array.array("i")
+    msg, ancdata, _, _ = sock.recvmsg(
+        _header.size, socket.CMSG_SPACE(_maxfds * fds.itemsize)
+    )
+    for level, typ, data in ancdata:
+        if level == socket.SOL_SOCKET and typ == socket.SCM_RIGHTS:
+            fds.frombytes(data[: len(data) - (len(data) % fds.itemsize)])
+    if len(msg) < _header.size:
+        msg += _recv_exactly(sock, _header.size - len(msg))
+    (size,) = _header.unpack(msg)
+    return json.loads(_recv_exactly(sock, size)), list(fds)
+
+
+def request(socket_path, argv, env=None, cwd=None):
+    """Ask a ``voir serve`` server to run voir with the given arguments.
+
+    The standard streams of this process and its ``DATA_FD`` (if open) are
+    forwarded to the child, so its output appears as if voir was run locally.
+    If this process is interrupted, the server kills the child.
+
+    Arguments:
+        socket_path: The path to the server's socket.
+        argv: The arguments to voir.
+        env: The environment of the child (defaults to ``os.environ``).
+        cwd: The working directory of the child (defaults to the current one).
+
+    Returns:
+        The return code of the child.
+    """
+    env = dict(os.environ if env is None else env)
+    env.pop("VOIR_SERVER", None)
+    targets = [0, 1, 2, int(env.get("DATA_FD", 3))]
+    targets = [fd for fd in dict.fromkeys(targets) if _is_open(fd)]
+    payload = {
+        "argv": list(argv),
+        "env": env,
+        "cwd": os.path.abspath(os.curdir if cwd is None else cwd),
+        "fds": targets,
+    }
+    for stream in (sys.stdout, sys.stderr):
+        stream.flush()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        _send_request(sock, payload, targets)
+        response = b""
+        while chunk := sock.recv(4096):
+            response += chunk
+    if not response:
+        print("voir: the server closed the connection", file=sys.stderr)
+        return 1
+    return json.loads(response)["returncode"]
+
+
+def _is_open(fd):
+    try:
+        os.fstat(fd)
+        return True
+    except OSError:
+        return False
+
+
+def _exit_code(exc):
+    code = exc.code
+    if code is None:
+        return 0
+    elif isinstance(code, int):
+        return code
+    else:
+        print(code, file=sys.stderr)
+        return 1
+
+
+def _check_forkable(allow_threads):
+    """Return a list of reasons why it is unsafe to fork the current process."""
+    problems = []
+    threads = [
+        t.name for t in threading.enumerate() if t is not threading.main_thread()
+    ]
+    if threads and not allow_threads:
+        problems.append(
+            f"preloading started threads ({', '.join(threads)}), which do not"
+            " survive a fork (use --allow-threads to ignore)"
+        )
+    torch = sys.modules.get("torch", None)
+    cuda = getattr(torch, "cuda", None)
+    if cuda is not None and cuda.is_initialized():
+        problems.append("preloading initialized CUDA, which does not survive a fork")
+    return problems
+
+
+def _run_child(request, fds):
+    """Run voir in the forked child. Never returns."""
+    code = 1
+    try:
+        for fd, target in zip(fds, request["fds"]):
+            if fd != target:
+                os.dup2(fd, target)
+                os.close(fd)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        sys.argv = ["voir", *request["argv"]]
+
+        from .cli import main
+
+        main(request["argv"])
+        code = 0
+    except SystemExit as exc:
+        code = _exit_code(exc)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+class Server:
+    """Fork a child for each request received on a Unix socket.
+
+    Arguments:
+        socket_path: The path of the socket to listen on.
+        preload: Modules to import before serving.
+        allow_threads: Serve even if preloading started threads.
+    """
+
+    def __init__(self, socket_path, preload=(), allow_threads=False):
+        self.socket_path = socket_path
+        self.preload = list(preload)
+        self.allow_threads = allow_threads
+        self.children = {}
+        self.running = False
+        self.listener = None
+
+    def prepare(self):
+        """Import voir's modules and the preloaded modules."""
+        import importlib
+
+        for name in ["voir.cli", "voir.overseer", *self.preload]:
+            importlib.import_module(name)
+        problems = _check_forkable(self.allow_threads)
+        if problems:
+            raise RuntimeError("Cannot serve: " + "; ".join(problems))
+
+    def listen(self):
+        """Listen on the socket.
+
+        A socket left over by a server that is gone is replaced, but if another
+        server is live on it, or if something else than a socket is at the
+        path, RuntimeError is raised.
+        """
+        try:
+            mode = os.stat(self.socket_path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise RuntimeError(f"{self.socket_path} exists and is not a socket")
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path)
+            else:
+                raise RuntimeError(f"another server is listening on {self.socket_path}")
+            finally:
+                probe.close()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        self.listener.listen()
+
+    def serve(self):
+        """Serve requests until :meth:`stop` is called or SIGTERM is received."""
+        if self.listener is None:
+            self.listen()
+        listener = self.listener
+        sel = selectors.DefaultSelector()
+        sel.register(listener, selectors.EVENT_READ)
+        self.running = True
+        try:
+            while self.running:
+                for key, _ in sel.select(timeout=0.1):
+                    if key.fileobj is listener:
+                        conn, _ = listener.accept()
+                        self._fork(conn, listener, sel)
+                    else:
+                        # The client went away: kill its child
+                        self._kill(key.fileobj, sel)
+                self._reap(sel)
+        finally:
+            for conn in list(self.children):
+                self._kill(conn, sel)
+            self._reap(sel, block=True)
+            sel.close()
+            listener.close()
+            self.listener = None
+            os.unlink(self.socket_path)
+
+    def stop(self):
+        """Stop serving."""
+        self.running = False
+
+    def _fork(self, conn, listener, sel):
+        try:
+            req, fds = _recv_request(conn)
+        except (EOFError, OSError, ValueError):
+            conn.close()
+            return
+        problems = _check_forkable(self.allow_threads)
+        if problems:  # pragma: no cover
+            # Something started a thread since the server started
+            print("voir serve: " + "; ".join(problems), file=sys.stderr)
+            conn.close()
+            return
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            # Coverage is not collected in the child
+            sel.close()
+            listener.close()
+            for other in self.children:
+                other.close()
+            conn.close()
+            _run_child(req, fds)
+        for fd in fds:
+            os.close(fd)
+        self.children[conn] = pid
+        sel.register(conn, selectors.EVENT_READ)
+
+    def _kill(self, conn, sel):
+        pid = self.children.get(conn, None)
+        if pid is not None:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:  # pragma: no cover
+                pass
+        if _registered(sel, conn):
+            sel.unregister(conn)
+
+    def _reap(self, sel, block=False):
+        for conn, pid in list(self.children.items()):
+            wpid, status = os.waitpid(pid, 0 if block else os.WNOHANG)
+            if wpid == 0:
+                continue
+            del self.children[conn]
+            if _registered(sel, conn):
+                sel.unregister(conn)
+            if os.WIFEXITED(status):
+                code = os.WEXITSTATUS(status)
+            else:
+                code = -os.WTERMSIG(status)
+            try:
+                conn.sendall(json.dumps({"returncode": code}).encode("utf8"))
+            except OSError:
+                pass
+            conn.close()
+
+
+def _registered(sel, conn):
+    try:
+        sel.get_key(conn)
+        return True
+    except KeyError:
+        return False
+
+
+def serve_main(argv):
+    """Entry point for ``voir serve``."""
+    parser = argparse.ArgumentParser(
+        prog="voir serve", description="Run voir from a pre-forked server."
+    )
+    parser.add_argument(
+        "--socket",
+        default=os.environ.get("VOIR_SERVER", None),
+        required="VOIR_SERVER" not in os.environ,
+        help="Path of the Unix socket to listen on (default: $VOIR_SERVER)",
+    )
+    parser.add_argument(
+        "--preload",
+        action="append",
+        default=[],
+        help="Module to import before serving (can be given multiple times)",
+    )
+    parser.add_argument(
+        "--allow-threads",
+        action="store_true",
+        help="Serve even if preloading started threads",
+    )
+    options = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):  # pragma: no cover
+        sys.exit("voir serve: fork() is not available on this platform")
+
+    sys.path.insert(0, os.path.abspath(os.curdir))
+    server = Server(
+        options.socket,
+        preload=[m for spec in options.preload for m in spec.split(",") if m],
+        allow_threads=options.allow_threads,
+    )
+    try:
+        server.prepare()
+        server.listen()
+    except RuntimeError as exc:
+        sys.exit(f"voir serve: {exc}")
+
+    signal.signal(signal.SIGTERM, lambda *_: server.stop())
+    print(f"voir serve: listening on {options.socket}", file=sys.stderr, flush=True)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
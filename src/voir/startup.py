@@ -0,0 +1,150 @@
+"""Measure where the time goes before the script starts running.
+
+Set ``VOIR_PROFILE_STARTUP=1`` in the environment of the ``voir`` command to
+enable this (it has no effect when voir is imported as a library). voir then
+records the time spent importing its own dependencies, running each voirfile,
+initializing each instrument, and splitting and executing the script's prelude.
+The breakdown is logged as a ``startup_profile`` event right before the main
+section of the script starts, and a human-readable summary is printed to
+stderr.
+
+This module must only depend on the standard library, because it is imported
+first, in order to time the imports that follow.
+"""
+
+import builtins
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class StartupProfile:
+    """Collect timings for the startup of voir.
+
+    Timings are stored in nanoseconds in ``self.sections``, which maps a
+    section name (e.g. ``"voirfiles"``) to a dictionary from entry name to
+    time.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter_ns()
+        self.sections = {}
+        self._original_import = None
+        self._import_depth = 0
+
+    def add(self, section, name, ns):
+        """Add ``ns`` nanoseconds to the entry ``name`` of ``section``."""
+        entries = self.sections.setdefault(section, {})
+        entries[name] = entries.get(name, 0) + ns
+
+    @contextmanager
+    def measure(self, section, name):
+        """Context manager to time a block into the entry ``name`` of ``section``."""
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(section, name, time.perf_counter_ns() - t0)
+
+    def watch_imports(self):
+        """Time the third-party modules that voir imports, by top-level package.
+
+        Only imports made directly by voir's modules are timed. The time spent
+        in the transitive imports of a dependency is attributed to it.
+        """
+        if self._original_import is not None:  # pragma: no cover
+            return
+        self._original_import = original = builtins.__import__
+
+        def _import(name, globals=None, locals=None, fromlist=(), level=0):
+            importer = globals.get("__name__", "") if globals else ""
+            if (
+                level
+                or self._import_depth
+                or name in sys.modules
+                or importer.partition(".")[0] != "voir"
+                or name.partition(".")[0] == "voir"
+            ):
+                return original(name, globals, locals, fromlist, level)
+            self._import_depth += 1
+            t0 = time.perf_counter_ns()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self._import_depth -= 1
+                self.add("imports", name.partition(".")[0], time.perf_counter_ns() - t0)
+
+        builtins.__import__ = _import
+
+    def stop_imports(self):
+        """Stop timing imports.
+
+        The time spent importing voir's own modules is recorded under the
+        ``voir`` entry of the ``imports`` section.
+        """
+        if self._original_import is None:  # pragma: no cover
+            return
+        builtins.__import__ = self._original_import
+        self._original_import = None
+        total = time.perf_counter_ns() - self.start
+        imports = self.sections.setdefault("imports", {})
+        self.add("imports", "voir", total - sum(imports.values()))
+
+    def summary(self):
+        """Return the collected timings, in seconds."""
+        data = {
+            section: {name: ns / 1_000_000_000 for name, ns in entries.items()}
+            for section, entries in self.sections.items()
+        }
+        data["elapsed"] = (time.perf_counter_ns() - self.start) / 1_000_000_000
+        return data
+
+    def format(self, summary=None):
+        """Return a human-readable version of :meth:`summary`."""
+        summary = self.summary() if summary is None else summary
+        lines = [
+            f"voir: startup profile ({summary['elapsed']:.3f}s until the script's main section)"
+        ]
+        for section, entries in summary.items():
+            if section == "elapsed":
+                continue
+            lines.append(f"  {section:<40} {sum(entries.values()):8.3f}s")
+            for name, t in sorted(entries.items(), key=lambda kv: -kv[1]):
+                lines.append(f"    {name:<38} {t:8.3f}s")
+        return "\n".join(lines)
+
+
+def measure(section, name):
+    """Time a block if startup profiling is enabled, otherwise do nothing."""
+    if startup_profile is None:
+        return nullcontext()
+    return startup_profile.measure(section, name)
+
+
+def _running_cli():
+    """Return whether the process was started as the voir command.
+
+    If it was not, voir is used as a library, e.g. for :mod:`voir.proc`, and
+    :func:`voir.cli.main` will never stop the import hook.
+    """
+    if not sys.argv:  # pragma: no cover
+        return False
+    argv0 = sys.argv[0]
+    if argv0 == "-m":
+        # python -m voir, while the voir package is being imported
+        orig_argv = getattr(sys, "orig_argv", None)
+        if orig_argv is None:  # pragma: no cover
+            # Python < 3.10
+            return True
+        return any(
+            arg == "-m" and nxt == "voir" for arg, nxt in zip(orig_argv, orig_argv[1:])
+        )
+    return os.path.splitext(os.path.basename(argv0))[0] in ("voir", "voir-script")
+
+
+if os.environ.get("VOIR_PROFILE_STARTUP", "0") not in ("", "0") and _running_cli():
+    startup_profile = StartupProfile()
+    startup_profile.watch_imports()
+else:
+    startup_profile = None
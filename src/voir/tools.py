@@ -44,6 +44,7 @@ def gated(flag: str, instrument: meta(callable), help: str = None):  # noqa: F81
             ov.require(instrument)
 
     run.instrument = instrument
+    run.__qualname__ = getattr(instrument, "__qualname__", run.__qualname__)
     return run
 
 
@@ -80,6 +81,7 @@ def parametrized(  # noqa: F811
         yield ov.phases.parse_args
         ov.require(instrument)
 
+    run.__qualname__ = getattr(instrument, "__qualname__", run.__qualname__)
     return run
 
 
@@ -112,9 +114,17 @@ def instrument_definition(fn):
 
     @functools.wraps(fn)
     def wrapped(*args, **kwargs):
-        def instrument(ov):
-            yield from fn(ov, *args, **kwargs)
+        if inspect.isasyncgenfunction(fn):
 
+            def instrument(ov):
+                return fn(ov, *args, **kwargs)
+
+        else:
+
+            def instrument(ov):
+                yield from fn(ov, *args, **kwargs)
+
+        instrument.__qualname__ = fn.__qualname__
         return instrument
 
     return wrapped
@@ -17,6 +17,36 @@ def progdir():
     return _progdir
 
 
+_phase_timings = (
+    "time",
+    "perf_counter_ns",
+    "cpu_time",
+    "maxrss",
+    "duration",
+    "cpu_duration",
+)
+
+
+def redact_phase_timings(event, data):
+    """Patch out the timings of phase events, because they change every run."""
+    if event in ("phase", "phase_end"):
+        for k in _phase_timings:
+            if k in data:
+                data[k] = "X"
+    return data
+
+
+def _redact_data_line(line):
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return line
+    if isinstance(data, dict) and "$data" in data:
+        redact_phase_timings(data.get("$event"), data["$data"])
+        return json.dumps(data)
+    return line
+
+
 def _format(x):
     idx = x.get("index", 1)
     title = x.pipe or "---"
@@ -75,6 +105,7 @@ def run_program(file_regression):
             # Patch out the times because they will change from a run to the other
             if r.event in ("start", "end"):
                 r.data["time"] = "X"
+            redact_phase_timings(r.event, r.data)
 
         readable = "".join(_format(deepcopy(x)) for x in results)
         raw = "\n".join(
@@ -141,7 +172,10 @@ def capdata(data_fds):
         def read():
             r, _, _ = select.select([reader], [], [], 0)
             if reader in r:
-                return reader.read()
+                return "".join(
+                    f"{_redact_data_line(line)}\n"
+                    for line in reader.read().splitlines()
+                )
             else:
                 return ""
 
@@ -0,0 +1,6 @@
+import sys
+
+from giving import give
+
+if __name__ == "__main__":
+    give(argv=sys.argv[1:])
@@ -0,0 +1,11 @@
+import time
+
+from voir import give
+
+if __name__ == "__main__":
+    # A few warmup rates, then a rate that alternates between 100 and 101
+    rates = [10, 20, 30, 40, 50] + [100 + (i % 2) for i in range(95)]
+    for i, rate in enumerate(rates):
+        time.sleep(1)
+        give(task="train", rate=rate)
+        print(i)
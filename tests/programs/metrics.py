@@ -0,0 +1,10 @@
+from voir import counter, gauge, histogram
+
+if __name__ == "__main__":
+    tokens = counter("tokens")
+    size = gauge("size")
+    latency = histogram("latency")
+    for i in range(100):
+        tokens.inc(3)
+        size.set(i)
+        latency.observe(i)
@@ -0,0 +1,9 @@
+import time
+
+from voir import give
+
+if __name__ == "__main__":
+    for i in range(200):
+        time.sleep(0.01)
+        give(tick=i)
+        print(i)
@@ -0,0 +1,10 @@
+import time
+
+from voir import iterate
+
+if __name__ == "__main__":
+    # Steps get faster during the warmup, then stay at 0.1s
+    delays = [0.5, 0.4, 0.3, 0.2, 0.15] + [0.1] * 10
+    batches = [[i] * 10 for i in range(len(delays))]
+    for delay, batch in zip(delays, iterate("stuff", batches, report_batch=True)):
+        time.sleep(delay)
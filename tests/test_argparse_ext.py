@@ -1,7 +1,9 @@
 from dataclasses import dataclass, field
+from weakref import WeakKeyDictionary
 
 import pytest
 
+from voir import argparse_ext
 from voir.argparse_ext import ExtendedArgumentParser
 
 
@@ -112,3 +114,30 @@ def test_help_with_base(based_configuration, file_regression, capsys):
     file_regression.check(
         capsys.readouterr().out.replace("options:", "optional arguments:")
     )
+
+
+def test_lazy_help(monkeypatch):
+    scraped = []
+    scrape = argparse_ext._scrape_attribute_docstrings
+
+    def _scrape(cls):
+        scraped.append(cls)
+        return scrape(cls)
+
+    monkeypatch.setattr(argparse_ext, "_scrape_attribute_docstrings", _scrape)
+    monkeypatch.setattr(argparse_ext, "_docstrings_cache", WeakKeyDictionary())
+
+    p = ExtendedArgumentParser()
+    p.add_from_model("cfg", Configuration())
+    p.parse_args(["--helloes", "4"])
+    assert scraped == []
+
+    hlp = p.format_help()
+    assert "Hello there" in hlp
+    assert "Do not flag this" in hlp
+    assert sorted(cls.__name__ for cls in scraped) == ["Configuration", "Muffin"]
+
+    p = ExtendedArgumentParser()
+    p.add_from_model("cfg", Configuration())
+    assert "Hello there" in p.format_help()
+    assert len(scraped) == 2
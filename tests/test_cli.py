@@ -1,5 +1,11 @@
+import os
+import subprocess
+import sys
+
 import pytest
 
+from voir.cli import collect_contrib_instruments, entry_point_index
+
 
 @pytest.mark.parametrize("prelude", (["voir"], ["python", "-m", "voir"]))
 def test_cli(prelude, run_program):
@@ -28,3 +34,127 @@ def test_forward(run_program):
 
 def test_bad_unicode(run_program):
     run_program(["voir", "evil.py"])
+
+
+def test_profile_startup():
+    from voir.proc import run
+
+    from .common import _progdir
+
+    results = list(
+        run(
+            ["voir", "hello.py"],
+            info={},
+            cwd=_progdir,
+            env={**os.environ, "VOIRFILE": "voirfile.py", "VOIR_PROFILE_STARTUP": "1"},
+            timeout=None,
+            buffered=False,
+        )
+    )
+    (profile,) = [r.data for r in results if r.event == "startup_profile"]
+    assert {"imports", "voirfiles", "phases", "script", "instruments"} <= set(profile)
+    assert "giving" in profile["imports"]
+    assert "voirfile.py" in profile["voirfiles"]
+    assert set(profile["script"]) == {"split", "prelude"}
+    assert "instrument_greet" in profile["instruments"]
+    stderr = "".join(
+        r.data for r in results if r.event == "line" and r.pipe == "stderr"
+    )
+    assert "voir: startup profile" in stderr
+
+
+def test_profile_startup_library():
+    code = (
+        "import builtins, voir.proc, voir.startup\n"
+        "print(voir.startup.startup_profile is None,"
+        " builtins.__import__ is __import__)"
+    )
+    out = subprocess.check_output(
+        [sys.executable, "-c", code],
+        env={**os.environ, "VOIR_PROFILE_STARTUP": "1"},
+        text=True,
+    )
+    assert out.split() == ["True", "True"]
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    site = tmp_path / "site-packages"
+    dist = site / "voirplugin-1.0.dist-info"
+    dist.mkdir(parents=True)
+    (dist / "METADATA").write_text("Metadata-Version: 2.1\nName: voirplugin\n")
+    (dist / "entry_points.txt").write_text(
+        "[voir.instrument]\nplug_in = voirplugin:instrument\n"
+    )
+    (site / "voirplugin.py").write_text("def instrument(ov):\n    pass\n")
+    monkeypatch.syspath_prepend(str(site))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    yield site
+    sys.modules.pop("voirplugin", None)
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["hello.py"],
+        ["hello.py", "--plug-in"],
+        ["--dash", "hello.py", "--plug-in"],
+        ["--interval", "3", "hello.py", "--plug-in"],
+        ["-m", "hello", "--plug-in"],
+    ],
+)
+def test_contrib_not_enabled(plugin, tmp_path, monkeypatch, argv):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "hello.py").write_text("")
+    assert collect_contrib_instruments(argv) == []
+    assert "voirplugin" not in sys.modules
+
+
+@pytest.mark.parametrize(
+    "argv,names",
+    [
+        (["--plug-in", "hello.py"], ()),
+        (["--plug_in=1", "hello.py"], ()),
+        (["--interval", "3", "--plug-in", "hello.py"], ()),
+        (["hello.py"], ["plug_in"]),
+    ],
+)
+def test_contrib_enabled(plugin, argv, names):
+    (instrument,) = collect_contrib_instruments(argv, names)
+    assert instrument.__module__ == "voirplugin"
+
+
+def test_entry_point_index_cache(plugin, monkeypatch):
+    expected = [("plug_in", "voirplugin:instrument")]
+    assert entry_point_index() == expected
+
+    def fail():
+        raise AssertionError("entry points should come from the cache")
+
+    monkeypatch.setattr("importlib.metadata.entry_points", fail)
+    assert entry_point_index() == expected
+
+    # Installing something changes the mtime of site-packages
+    os.utime(plugin, ns=(0, 0))
+    with pytest.raises(AssertionError):
+        entry_point_index()
+
+
+def test_entry_point_index_pythonpath(plugin, tmp_path, monkeypatch):
+    assert entry_point_index() == [("plug_in", "voirplugin:instrument")]
+
+    # A distribution in a directory that is not named site-packages
+    other = tmp_path / "other"
+    other.mkdir()
+    monkeypatch.syspath_prepend(str(other))
+    assert entry_point_index() == [("plug_in", "voirplugin:instrument")]
+    dist = other / "otherplugin-1.0.dist-info"
+    dist.mkdir()
+    (dist / "METADATA").write_text("Metadata-Version: 2.1\nName: otherplugin\n")
+    (dist / "entry_points.txt").write_text(
+        "[voir.instrument]\nother = otherplugin:instrument\n"
+    )
+    assert entry_point_index() == [
+        ("other", "otherplugin:instrument"),
+        ("plug_in", "voirplugin:instrument"),
+    ]
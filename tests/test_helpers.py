@@ -1,6 +1,24 @@
-from giving import given
+import asyncio
+import gc
+import json
+import os
+import pickle
+import threading
+import time
 
-from voir.helpers import iterate
+import pytest
+from giving import give, given
+
+from voir.helpers import (
+    _Distribution,
+    _metrics,
+    aiterate,
+    counter,
+    gauge,
+    histogram,
+    iterate,
+    timed,
+)
 from voir.overseer import Overseer
 
 from .common import program
@@ -21,6 +39,31 @@ def test_iterate_program_report_batch(check_all):
     ov([program("iterate"), "1"])
 
 
+@pytest.mark.parametrize("listen", [False, True])
+def test_iterate_program_fast_path(listen):
+    everything = []
+
+    def spy(ov):
+        yield ov.phases.init
+        # Does not count as listening to the steps
+        ov.given._quiet() >> everything.append
+        ov.given.where("x") >> (lambda _: None)
+        if listen:
+            ov.given.where("progress") >> (lambda _: None)
+
+    ov = Overseer(instruments=[spy])
+    ov([program("iterate"), "1"])
+    assert ov.given.listens_to_steps is listen
+    progress = [d["progress"] for d in everything if "progress" in d]
+    wraps = [d for d in everything if "$wrap" in d]
+    if listen:
+        assert progress == [(i, 5) for i in range(6)]
+        assert len(wraps) == 10
+    else:
+        assert progress == [(0, 5)]
+        assert not wraps
+
+
 def test_log(check_all, data_fds):
     _, w = data_fds
     ov = Overseer(instruments=[], logfile=w)
@@ -68,3 +111,417 @@ def test_iterate_no_length():
             pass
 
     assert bs == list(range(1, 11)) + [None]
+
+
+def test_iterate_report_every():
+    with given() as gv:
+        bs = gv.wmap("step", _extractor("batch")).accum()
+        progress = gv["?progress"].accum()
+        results = list(iterate("x", range(10), report_batch=True, report_every=3))
+
+    assert results == list(range(10))
+    assert bs == [0, 3, 6, 9]
+    assert progress == [(0, 10), (1, 10), (4, 10), (7, 10), (10, 10)]
+
+
+def test_iterate_report_every_time(monkeypatch):
+    current = [0]
+    monkeypatch.setattr(time, "perf_counter", lambda: current[0])
+
+    with given() as gv:
+        bs = gv.wmap("step", _extractor("batch")).accum()
+        for _ in iterate("x", range(10), report_batch=True, report_every="2s"):
+            current[0] += 1
+
+    assert bs == [0, 2, 4, 6, 8]
+
+
+def test_iterate_no_listener():
+    assert list(iterate("x", range(10), report_batch=True)) == list(range(10))
+    assert list(iterate("x", iter(range(10)), report_batch=True)) == list(range(10))
+
+
+def test_iterate_prefetch():
+    with given() as gv:
+        bs = gv.wmap("step", _extractor("batch")).accum()
+        waits = gv["?data_wait"].accum()
+        progress = gv["?progress"].accum()
+        results = list(iterate("x", range(10), report_batch=True, prefetch=2))
+
+    assert results == bs == list(range(10))
+    assert len(waits) == 10
+    assert all(w >= 0 for w in waits)
+    assert progress == [(i, 10) for i in range(11)]
+
+
+def test_iterate_prefetch_overlaps_loading():
+    def slow():
+        for x in range(5):
+            time.sleep(0.05)
+            yield x
+
+    with given() as gv:
+        waits = gv["?data_wait"].accum()
+        for _ in iterate("x", slow(), prefetch=5):
+            # The loop body is slower than the loader
+            time.sleep(0.1)
+
+    # Only the first batch should have to wait for the loader
+    assert waits[0] > 0.03
+    assert all(w < 0.03 for w in waits[1:])
+
+
+def test_iterate_prefetch_error():
+    def bad():
+        yield 1
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        list(iterate("x", bad(), prefetch=2))
+
+
+def test_iterate_prefetch_break():
+    it = iterate("x", range(1000), prefetch=2)
+    assert next(it) == 0
+    it.close()
+
+
+def test_iterate_prefetch_process():
+    results = list(iterate("x", range(10), prefetch=2, prefetch_mode="process"))
+    assert results == list(range(10))
+
+
+class _Unpicklable:
+    def __iter__(self):
+        yield 1
+        yield lambda: None
+        yield 3
+
+
+class _Dies:
+    def __iter__(self):
+        yield 1
+        os._exit(3)
+
+
+def test_iterate_prefetch_process_unpicklable():
+    results = []
+    with pytest.raises((pickle.PicklingError, AttributeError, TypeError)):
+        for x in iterate("x", _Unpicklable(), prefetch=2, prefetch_mode="process"):
+            results.append(x)
+    assert results == [1]
+
+
+def test_iterate_prefetch_process_dies():
+    results = []
+    with pytest.raises(RuntimeError, match="exit code 3"):
+        for x in iterate("x", _Dies(), prefetch=2, prefetch_mode="process"):
+            results.append(x)
+    # The item may be lost if it was still in the queue's buffer
+    assert results in ([], [1])
+
+
+class _AsyncRange:
+    def __init__(self, n, delay=0):
+        self.n = n
+        self.delay = delay
+
+    def __len__(self):
+        return self.n
+
+    async def __aiter__(self):
+        for i in range(self.n):
+            await asyncio.sleep(self.delay)
+            yield i
+
+
+def test_aiterate():
+    async def main():
+        return [x async for x in aiterate("x", _AsyncRange(10), report_batch=True)]
+
+    with given() as gv:
+        bs = gv.wmap("step", _extractor("batch")).accum()
+        progress = gv["?progress"].accum()
+        results = asyncio.run(main())
+
+    assert results == bs == list(range(10))
+    assert progress == [(i, 10) for i in range(11)]
+
+
+def test_aiterate_timing():
+    def _timewrap():
+        t0 = time.perf_counter()
+        yield
+        return time.perf_counter() - t0
+
+    async def main():
+        async for _ in aiterate(
+            "x", _AsyncRange(3, delay=0.01), report_batch=True, batch_size=4
+        ):
+            await asyncio.sleep(0.05)
+
+    with given() as gv:
+        times = gv.wmap("step", _timewrap).accum()
+        asyncio.run(main())
+
+    assert len(times) == 3
+    assert all(t >= 0.06 for t in times)
+
+
+@pytest.mark.parametrize("close", [False, True])
+def test_aiterate_early_exit(close):
+    errors = []
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        it = aiterate("x", _AsyncRange(10), report_batch=True)
+        async for x in it:
+            if x == 3:
+                break
+        if close:
+            await it.aclose()
+            assert len(wraps) == 8
+            give(after=True)
+        gc.collect()
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    with given() as gv:
+        wraps = gv["?$wrap"].accum()
+        after = gv.where("after").accum()
+        asyncio.run(main())
+
+    assert not errors
+    assert [w["step"] for w in wraps] == ["begin", "end"] * 4
+    if close:
+        assert after == [{"after": True}]
+
+
+@pytest.mark.parametrize("report_every", [1, 100])
+def test_aiterate_task_in_body(report_every):
+    async def main():
+        async for x in aiterate("x", _AsyncRange(3), report_every=report_every):
+            give(y=x)
+        give(after=True)
+
+    with given() as gv:
+        ys = gv.where("y").accum()
+        after = gv.where("after").accum()
+        asyncio.run(main())
+
+    assert ys == [{"task": "x", "y": i} for i in range(3)]
+    assert after == [{"after": True}]
+
+
+@pytest.fixture
+def metrics():
+    _metrics.clear()
+    yield
+    _metrics.clear()
+
+
+def test_counter(metrics):
+    c = counter("c")
+    assert counter("c") is c
+    for _ in range(10):
+        c.inc()
+    c.inc(5)
+    assert c.value == 15
+    summary = c.summary()
+    assert summary["count"] == 15
+    assert summary["delta"] == 15
+    c.inc()
+    assert c.summary()["delta"] == 1
+
+
+def test_counter_threads(metrics):
+    c = counter("c")
+
+    def work():
+        for _ in range(10000):
+            c.inc()
+            c.inc(2)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert c.value == 4 * 10000 * 3
+
+
+def test_gauge(metrics):
+    g = gauge("g")
+    assert g.summary() is None
+    g.set(3)
+    g.set(7)
+    assert g.summary() == {"value": 7}
+
+
+def test_histogram(metrics):
+    h = histogram("h")
+    for i in range(100, 0, -1):
+        h.observe(i)
+    summary = h.summary()
+    assert summary["count"] == 100
+    assert summary["sum"] == 5050
+    assert summary["mean"] == pytest.approx(50.5)
+    assert summary["std"] == pytest.approx(29.011, rel=1e-4)
+    assert summary["min"] == 1
+    assert summary["max"] == 100
+    assert summary["p50"] == pytest.approx(51, rel=1 / 16)
+    assert summary["p90"] == pytest.approx(91, rel=1 / 16)
+    assert summary["p99"] == pytest.approx(100, rel=1 / 16)
+    assert h.summary() is None
+
+
+def test_histogram_bounded(metrics, monkeypatch):
+    monkeypatch.setattr("voir.helpers._PENDING_CAP", 1000)
+    h = histogram("h")
+    for i in range(100_000):
+        h.observe(i % 1000 - 500 + 0.5)
+    assert len(h._pending) < 1000
+    assert len(h._values.buckets) < 200
+    summary = h.summary()
+    assert summary["min"] == -499.5
+    assert summary["max"] == 499.5
+    assert summary["mean"] == pytest.approx(0, abs=1e-9)
+    assert summary["p50"] == pytest.approx(0.5, abs=0.1)
+    assert summary["p99"] == pytest.approx(489.5, rel=1 / 16)
+
+
+def test_distribution():
+    dist = _Distribution()
+    for x in range(1, 1001):
+        dist.add(x)
+    summary = dist.summary((0.5, 0.95, 0.99))
+    assert summary["count"] == 1000
+    assert summary["mean"] == pytest.approx(500.5)
+    assert summary["std"] == pytest.approx(288.82, rel=1e-4)
+    assert summary["min"] == 1
+    assert summary["max"] == 1000
+    for q, expected in [("p50", 500), ("p95", 950), ("p99", 990)]:
+        assert summary[q] == pytest.approx(expected, rel=1 / 16)
+
+    other = _Distribution()
+    for x in range(1001, 2001):
+        other.add(x)
+    dist.merge(other)
+    assert dist.sum == sum(range(1, 2001))
+    summary = dist.summary()
+    assert summary["mean"] == pytest.approx(1000.5)
+    assert summary["std"] == pytest.approx(577.49, rel=1e-4)
+    assert summary["p50"] == pytest.approx(1000, rel=1 / 16)
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5],
+        [0, -0.0, 1e-300, -2.5, 7.25, 1e100, -1, 0.5, 0.5625],
+        [1e9 + i / 7 for i in range(100)],
+    ],
+)
+def test_distribution_update(values):
+    one, many = _Distribution(), _Distribution()
+    for x in values:
+        one.add(x)
+    many.update(values)
+    assert many.buckets == one.buckets
+    assert (many.count, many.sum, many.min, many.max) == (
+        one.count,
+        one.sum,
+        one.min,
+        one.max,
+    )
+    assert many.mean == pytest.approx(one.mean)
+    assert many.m2 == pytest.approx(one.m2, rel=1e-6)
+
+
+def test_metric_wrong_kind(metrics):
+    counter("x")
+    with pytest.raises(TypeError):
+        gauge("x")
+    timed("y")
+    with pytest.raises(TypeError):
+        histogram("y")
+
+
+def test_metrics_program(metrics, tmp_path):
+    logfile = tmp_path / "data.jsonl"
+    ov = Overseer(instruments=[], logfile=str(logfile))
+    ov([program("metrics")])
+    events = [json.loads(line) for line in logfile.read_text().splitlines()]
+    (summary,) = [e["$data"] for e in events if e["$event"] == "metrics"]
+    assert summary["tokens"]["count"] == 300
+    assert summary["size"] == {"value": 99}
+    assert summary["latency"]["count"] == 100
+    assert summary["latency"]["max"] == 99
+    # Metrics do not outlive the run
+    assert not _metrics
+
+
+def test_timed(metrics, monkeypatch):
+    current = [0]
+    monkeypatch.setattr(time, "perf_counter_ns", lambda: current[0])
+
+    @timed("f")
+    def f(duration):
+        current[0] += duration
+
+    for i in range(1, 101):
+        f(i * 1000)
+
+    with timed("f"):
+        current[0] += 1_000_000
+
+    summary = _metrics["f"].summary()
+    assert summary["count"] == 101
+    assert summary["min"] == 1e-6
+    assert summary["max"] == 1e-3
+    assert summary["p50"] == pytest.approx(51e-6, rel=1 / 16)
+    assert summary["p90"] == pytest.approx(91e-6, rel=1 / 16)
+    assert summary["p99"] == pytest.approx(100e-6, rel=1 / 16)
+    assert _metrics["f"].summary() is None
+
+
+def test_timed_nested(metrics):
+    t = timed("nested")
+    with t:
+        with t:
+            pass
+    assert _metrics["nested"].summary()["count"] == 2
+
+
+def test_timed_threads(metrics):
+    # a enters, b enters, a exits, b exits
+    t = timed("threads")
+    a_in, b_in, a_out = threading.Event(), threading.Event(), threading.Event()
+
+    def a():
+        with t:
+            a_in.set()
+            b_in.wait()
+            time.sleep(0.1)
+        a_out.set()
+
+    def b():
+        a_in.wait()
+        time.sleep(0.1)
+        with t:
+            b_in.set()
+            a_out.wait()
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=a), threading.Thread(target=b)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Each block lasts about 0.2s, but if a were paired with the start of b,
+    # it would last about 0.1s
+    summary = _metrics["threads"].summary()
+    assert summary["count"] == 2
+    assert summary["min"] >= 0.15
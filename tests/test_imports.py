@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from .common import _progdir
+
+# Generous, to avoid flakiness on slow machines: importing voir.cli takes
+# about 0.2s on a typical machine, almost all of it in giving.
+IMPORT_BUDGET = 1.5
+
+# Modules that should only be imported when the feature that needs them is used
+heavy = {"omegaconf", "pkg_resources", "psutil", "ptera", "rich", "yaml"}
+
+snippet = """
+import json, sys, time
+t0 = time.perf_counter()
+from voir.cli import main
+elapsed = time.perf_counter() - t0
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+sys.stdout.flush()
+print(json.dumps({
+    "elapsed": elapsed,
+    "modules": sorted({name.split(".")[0] for name in sys.modules}),
+}), file=sys.stderr)
+"""
+
+
+def _run(*argv):
+    proc = subprocess.run(
+        [sys.executable, "-c", snippet, *argv],
+        cwd=_progdir,
+        env={**os.environ, "VOIRFILE": ""},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stderr.strip().splitlines()[-1])
+
+
+def test_import_voir():
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, voir; print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {name.split(".")[0] for name in proc.stdout.split()}
+    assert not modules & {*heavy, "giving", "ovld", "reactivex"}
+
+
+@pytest.mark.parametrize("argv", [["--help"], ["hello.py"]])
+def test_cli_imports(argv):
+    results = _run(*argv)
+    assert results["elapsed"] < IMPORT_BUDGET
+    assert not set(results["modules"]) & heavy
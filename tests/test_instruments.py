@@ -1,14 +1,23 @@
+import fnmatch
+import json
+import threading
 import time
 
 import pytest
 
+from voir.helpers import _metrics
 from voir.instruments.gpu import (
     NotAvailable,
     get_backends,
     get_gpu_info,
+    gpu_monitor,
     select_backend,
 )
-from voir.instruments.metric import rate
+from voir.instruments.log import _Aggregate, _keep, log
+from voir.instruments.manage import early_stop, early_stop_converged
+from voir.instruments.metric import _Energy, energy, rate
+from voir.instruments.utils import Monitor
+from voir.overseer import Overseer
 
 from .common import program
 
@@ -50,6 +59,17 @@ def test_rate(ov, interval, faketime):
     assert c.results == [100] * (10 // interval)
 
 
+def test_rate_time_interval(ov, faketime):
+    c = Collect()
+
+    ov.require(c)
+    ov.require(rate(interval="0.2s", batch_size_calc=len))
+
+    ov([program("rates")])
+    assert len(c.results) >= 3
+    assert set(c.results) == {100}
+
+
 @pytest.mark.parametrize("interval", [1, 2, 5])
 def test_sync(ov, interval, faketime):
     def sync():
@@ -82,3 +102,381 @@ def test_select_backend_rocm():
 def test_select_backend_cuda():
     with pytest.raises(NotAvailable):
         select_backend("cuda")
+
+
+def _keep_reference(patterns, context, data):
+    result = {}
+    ok = False
+    for k, v in data.items():
+        if any(fnmatch.fnmatchcase(k, p) for p in context):
+            result[k] = v
+        if any(fnmatch.fnmatchcase(k, p) for p in patterns):
+            result[k] = v
+            ok = True
+    return ok and result
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"x": 2},
+        {"x": 2, "task": "train"},
+        {"x": 2, "a": 3},
+        {"xylophone": 1},
+        {"a": 3},
+        {"a": 3, "task": "train"},
+        {"loss1": 1.5, "lossy": 3, "task": "train", "x": 1},
+        {"y.z": 1, "yaz": 2},
+    ],
+)
+def test_log_keep(data):
+    patterns = {"x*", "loss[0-9]", "y.z"}
+    context = {"task"}
+    keep = _keep(patterns, context)
+    expected = _keep_reference(patterns, context, data)
+    # Twice to go through the memoized path
+    assert keep(data) == expected
+    assert keep(dict(data)) == expected
+
+
+def test_log(ov, capdata):
+    ov.require(log("n", "+m"))
+    ov([program("giver")])
+    data = [json.loads(line) for line in capdata().splitlines()]
+    assert [d for d in data if "$event" not in d] == [
+        {"n": 0},
+        {"n": 1},
+        {"n": 2},
+        {"n": 100},
+    ]
+
+
+def test_log_aggregate(ov, capdata):
+    ov.require(log("n", aggregate=2))
+    ov([program("giver")])
+    data = [json.loads(line) for line in capdata().splitlines()]
+    assert [d for d in data if "$event" not in d] == [
+        {"n": {"mean": 0.5, "min": 0, "max": 1, "last": 1, "count": 2}},
+        {"n": {"mean": 51, "min": 2, "max": 100, "last": 100, "count": 2}},
+    ]
+
+
+def test_log_aggregate_tasks():
+    results = []
+    agg = _Aggregate(2, results.append)
+    agg({"task": "train", "loss": 4, "mode": "a"})
+    agg({"task": "valid", "acc": 0.5})
+    agg({"task": "train", "loss": 2, "mode": "a"})
+    agg({"task": "train", "loss": 1, "mode": "a"})
+    agg({"task": "train", "loss": 3, "mode": "b"})
+    agg({"task": "train", "mode": "b"})
+    agg({"task": "train", "mode": "b"})
+    agg.flush_all()
+    assert results == [
+        {
+            "task": "train",
+            "mode": "a",
+            "loss": {"mean": 3, "min": 2, "max": 4, "last": 2, "count": 2},
+        },
+        {
+            "task": "train",
+            "mode": "b",
+            "loss": {"mean": 2, "min": 1, "max": 3, "last": 3, "count": 2},
+        },
+        # The train window with only an unchanged mode is not forwarded
+        {
+            "task": "valid",
+            "acc": {"mean": 0.5, "min": 0.5, "max": 0.5, "last": 0.5, "count": 1},
+        },
+    ]
+
+
+def test_log_aggregate_time(monkeypatch):
+    now = [0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    results = []
+    agg = _Aggregate("5s", results.append)
+    for i in range(12):
+        agg({"x": i})
+        now[0] += 1
+    agg.flush_all()
+    assert [r["x"]["count"] for r in results] == [6, 6]
+
+
+def test_early_stop_drained(data_fds, outlines):
+    progress = []
+
+    def worker(ov):
+        yield ov.phases.init
+        ov.given.where(task="early_stop") >> progress.append
+
+        def work():
+            for i in range(1000):
+                time.sleep(0.005)
+                ov.give(sample=i)
+
+        yield ov.phases.load_script
+        threading.Thread(target=work, daemon=True).start()
+
+    _, w = data_fds
+    ov = Overseer(
+        instruments=[worker, early_stop(key="sample", n=5)],
+        logfile=w,
+        drain_interval=0.02,
+    )
+    ov([program("ticks")])
+    assert ov.status == "stopped"
+    # The main thread stopped at the next tick after the samples were drained
+    assert len(outlines()) < 200
+    # The progress given by early_stop on the drain thread went through
+    assert [p["progress"] for p in progress[:5]] == [(i, 5) for i in range(1, 6)]
+
+
+def _early_stop_event(capdata):
+    data = [json.loads(line) for line in capdata().splitlines()]
+    (event,) = [d["$data"] for d in data if d.get("$event") == "early_stop"]
+    return event
+
+
+def test_early_stop_converged(ov, outlines, capdata, faketime):
+    ov.require(early_stop_converged(task="train", window=10, ci=0.01))
+    ov([program("converge")])
+    # Converges once the window contains no warmup rate
+    assert outlines()[-1] == "13"
+    event = _early_stop_event(capdata)
+    assert event["reason"] == "converged"
+    assert event["samples"] == 15
+    assert event["mean"] == 100.5
+
+
+def test_early_stop_converged_cv(ov, outlines, faketime):
+    ov.require(early_stop_converged(window=4, ci=None, cv=0.1))
+    ov([program("converge")])
+    # Converges once the window contains no warmup rate
+    assert outlines()[-1] == "7"
+
+
+def test_early_stop_converged_max_samples(ov, outlines, capdata, faketime):
+    ov.require(early_stop_converged(ci=0, max_samples=20))
+    ov([program("converge")])
+    assert outlines()[-1] == "18"
+    assert _early_stop_event(capdata)["reason"] == "max_samples"
+
+
+def test_early_stop_converged_budget(ov, outlines, capdata, faketime):
+    ov.require(early_stop_converged(ci=0, budget=30))
+    ov([program("converge")])
+    assert outlines()[-1] == "28"
+    assert _early_stop_event(capdata)["reason"] == "budget"
+
+
+def test_early_stop_converged_auto_skip(ov, capdata, faketime):
+    ov.require(rate(interval=1, skip="auto", steady_window=3, batch_size_calc=len))
+    ov.require(early_stop_converged(window=2, ci=None, cv=0.01))
+    ov([program("warmup")])
+    # Only the rates after the detected warmup are counted
+    assert _early_stop_event(capdata)["samples"] == 2
+
+
+def test_rate_distribution(ov, capdata, faketime):
+    results = []
+
+    def collect(ov):
+        yield ov.phases.init
+        ov.given.where("rate") >> results.append
+
+    ov.require(collect)
+    ov.require(rate(interval=2, batch_size_calc=len))
+    ov([program("rates")])
+    assert len(results) == 5
+    for r in results:
+        assert r["step_time"]["p50"] == pytest.approx(0.1)
+        assert r["step_time"]["p99"] == pytest.approx(0.1)
+        assert r["step_time"]["std"] == pytest.approx(0)
+        assert r["step_rate"]["min"] == pytest.approx(100)
+
+    data = [json.loads(line) for line in capdata().splitlines()]
+    (summary,) = [d["$data"] for d in data if d.get("$event") == "rate_summary"]
+    assert summary["stuff"]["rate"] == pytest.approx(100)
+    assert summary["stuff"]["steps"] == 10
+    assert summary["stuff"]["step_rate"]["p95"] == pytest.approx(100)
+
+
+def test_rate_auto_skip(ov, capdata, faketime):
+    results = []
+
+    def collect(ov):
+        yield ov.phases.init
+        ov.given.where("rate") >> results.append
+
+    ov.require(collect)
+    ov.require(rate(interval=1, skip="auto", steady_window=3, batch_size_calc=len))
+    ov([program("warmup")])
+
+    assert [round(r["rate"]) for r in results] == [20, 25, 33, 50, 67] + [100] * 10
+    # Steady once the window holds three fast steps
+    assert [r["steady"] for r in results] == [False] * 8 + [True] * 7
+
+    data = [json.loads(line) for line in capdata().splitlines()]
+    (warmup,) = [d["$data"] for d in data if d.get("$event") == "warmup"]
+    assert warmup["task"] == "stuff"
+    assert warmup["intervals"] == 5
+    assert warmup["steps"] == 5
+    assert warmup["seconds"] == pytest.approx(1.55)
+
+    (summary,) = [d["$data"] for d in data if d.get("$event") == "rate_summary"]
+    assert summary["stuff"]["steady"] is True
+    assert summary["stuff"]["steps"] == 7
+    assert summary["stuff"]["rate"] == pytest.approx(100)
+    assert summary["stuff"]["warmup"]["intervals"] == 5
+
+
+def test_rate_auto_skip_never_steady(ov, capdata, faketime):
+    ov.require(rate(interval=1, skip="auto", steady_window=20, batch_size_calc=len))
+    ov([program("warmup")])
+
+    data = [json.loads(line) for line in capdata().splitlines()]
+    assert not [d for d in data if d.get("$event") == "warmup"]
+    (summary,) = [d["$data"] for d in data if d.get("$event") == "rate_summary"]
+    assert summary["stuff"]["steady"] is False
+    assert summary["stuff"]["warmup"] is None
+    assert summary["stuff"]["steps"] == 15
+
+
+class SyntheticSMI:
+    """DeviceSMI backend with two devices that draw 100W and 50W."""
+
+    arch = "synthetic"
+    visible_devices = ""
+
+    def get_gpus_info(self, selection=None):
+        return {
+            device: {
+                "device": device,
+                "memory": {"used": 1, "total": 2},
+                "utilization": {"compute": 0.5},
+                "temperature": 40,
+                "power": power,
+            }
+            for device, power in [("0", 100.0), ("1", 50.0)]
+        }
+
+    def close(self):
+        pass
+
+
+def test_energy(ov, capdata, faketime, monkeypatch):
+    monkeypatch.setattr("voir.instruments.gpu.DEVICESMI", SyntheticSMI())
+    sample = gpu_monitor()
+    results = []
+
+    def sampler(ov):
+        yield ov.phases.init
+        ov.given.where("energy_j") >> results.append
+        steps = []
+
+        def _sample(data):
+            # Sample the power on irregular steps
+            steps.append(data)
+            if len(steps) not in (3, 4, 8):
+                ov.give(task="main", time=time.time(), gpudata=sample())
+
+        ov.given.where("loss") >> _sample
+
+    ov.require(sampler, rate(interval=2, batch_size_calc=len), energy())
+    ov([program("rates")])
+
+    # The first rate only starts the first interval
+    assert len(results) == 4
+    for r in results:
+        assert r["energy_j"] == pytest.approx(30)
+        assert r["watts"] == pytest.approx(150)
+        assert r["items_per_joule"] == pytest.approx(100 / 150)
+
+    data = [json.loads(line) for line in capdata().splitlines()]
+    (summary,) = [d["$data"] for d in data if d.get("$event") == "energy_summary"]
+    assert summary["energy_j"] == pytest.approx(135)
+    assert summary["seconds"] == pytest.approx(0.9)
+    assert summary["devices"]["1"]["watts"] == pytest.approx(50)
+    task = summary["tasks"]["stuff"]
+    assert task["energy_j"] == pytest.approx(120)
+    assert task["items"] == pytest.approx(80)
+    assert task["items_per_joule"] == pytest.approx(100 / 150)
+
+
+def test_energy_integral():
+    e = _Energy()
+    assert e.at(5) == 0
+    # Irregular samples of a linear ramp
+    e.add(0, 0.0)
+    e.add(1, 10.0)
+    e.add(3, 30.0)
+    assert e.joules == pytest.approx(45)
+    # Out of order samples are ignored
+    e.add(2, 1000.0)
+    assert e.joules == pytest.approx(45)
+    # Hold the last power after the last sample
+    assert e.at(4) == pytest.approx(75)
+
+
+def test_monitor_no_drift():
+    calls = []
+
+    def func():
+        calls.append(time.monotonic())
+        time.sleep(0.01)
+
+    mon = Monitor(0.02, func)
+    mon.start()
+    time.sleep(0.21)
+    mon.stop()
+    mon.join(1)
+    # The time spent in func does not delay the next call
+    assert 9 <= len(calls) <= 11
+    assert calls[-1] - calls[0] == pytest.approx(0.02 * (len(calls) - 1), abs=0.01)
+    assert mon.stats()["overruns"] == 0
+
+
+def test_monitor_overruns():
+    calls = []
+
+    def func():
+        calls.append(time.monotonic())
+        if len(calls) == 2:
+            time.sleep(0.16)
+
+    mon = Monitor(0.05, func)
+    mon.start()
+    time.sleep(0.4)
+    mon.stop()
+    mon.join(1)
+    # The missed ticks are skipped rather than run back to back
+    assert calls[2] - calls[1] >= 0.16
+    assert calls[3] - calls[2] >= 0.04
+    assert mon.stats()["overruns"] == 3
+
+
+def test_monitor_stop_wakes_up():
+    mon = Monitor(100, lambda: None)
+    mon.start()
+    t0 = time.monotonic()
+    mon.stop()
+    mon.join(1)
+    assert not mon.is_alive()
+    assert time.monotonic() - t0 < 1
+    assert mon.stopped
+
+
+def test_monitor_metrics():
+    _metrics.clear()
+    try:
+        mon = Monitor(0.01, lambda: None, metrics="mon")
+        mon.start()
+        time.sleep(0.105)
+        mon.stop()
+        mon.join(1)
+        assert _metrics["mon.sample_rate"].value == pytest.approx(100, rel=0.3)
+        assert _metrics["mon.jitter"].summary()["count"] == mon.samples
+        assert _metrics["mon.overruns"].value == 0
+    finally:
+        _metrics.clear()
@@ -1,8 +1,11 @@
+import json
 import os
+import threading
+import time
 
 import pytest
 
-from voir.overseer import JsonlFileLogger
+from voir.overseer import JsonlFileLogger, Overseer, summarize_times
 
 from .common import program
 
@@ -101,3 +104,210 @@ def test_jsonl_logger_bad_str():
     logger.log({"a": Terrible()})
     logger.close()
     assert open(r, "r").read() == '{"$unrepresentable": null}\n'
+
+
+def test_jsonl_logger_compact():
+    r, w = os.pipe()
+    logger = JsonlFileLogger(w, compact=True)
+    logger.log({"a": 1, "b": 2})
+    logger.log({"a": 3, "b": 4})
+    logger.log({"b": 5, "a": 6})
+    logger.log({"a": Terrible()})
+    logger.close()
+    assert open(r, "r").read().splitlines() == [
+        '{"$schema": 0, "$keys": ["a", "b"]}',
+        "[0, 1, 2]",
+        "[0, 3, 4]",
+        '{"$schema": 1, "$keys": ["b", "a"]}',
+        "[1, 5, 6]",
+        '{"$unrepresentable": null}',
+    ]
+
+
+def test_jsonl_logger_compact_threads(tmp_path):
+    logfile = tmp_path / "data.jsonl"
+    logger = JsonlFileLogger(str(logfile), compact=True)
+    write = logger.out.write
+
+    def slow_write(txt):
+        # Let the other threads run between the schema and the row
+        time.sleep(0.0001)
+        write(txt)
+
+    logger.out.write = slow_write
+
+    def work(t):
+        for i in range(200):
+            logger.log({f"t{t % 2}": t, f"i{i % 20}": i})
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    logger.close()
+
+    schemas = {}
+    rows = []
+    for line in logfile.read_text().splitlines():
+        data = json.loads(line)
+        if isinstance(data, dict):
+            assert data["$schema"] not in schemas
+            schemas[data["$schema"]] = data["$keys"]
+        else:
+            sid, *values = data
+            rows.append(dict(zip(schemas[sid], values)))
+    assert len(rows) == 8 * 200
+    for row in rows:
+        (t, i) = row.items()
+        assert t == (f"t{t[1] % 2}", t[1])
+        assert i == (f"i{i[1] % 20}", i[1])
+
+
+def _slow(ov):
+    yield ov.phases.init
+    time.sleep(0.05)
+    ov.given.where("n").subscribe(lambda _: time.sleep(0.02))
+    yield ov.phases.run_script
+
+
+def test_instrument_overhead(ov, capdata):
+    ov.require(_slow)
+    ov(["--voir-profile", program("giver")])
+    events = [json.loads(line) for line in capdata().split("\n") if line]
+    (overhead,) = [
+        e["$data"] for e in events if e.get("$event") == "instrument_overhead"
+    ]
+    times = overhead["_slow"]
+    assert times["phases"]["init"] >= 0.05
+    assert times["phases"]["run_script"] >= 0.08
+    assert times["total"] == pytest.approx(sum(times["phases"].values()))
+
+
+@pytest.mark.parametrize("args", [["--v"], ["--voir-profile", "x"]])
+def test_script_arguments(args):
+    results = []
+
+    def _argv(ov):
+        yield ov.phases.init
+        ov.given["?argv"] >> results.append
+
+    ov = Overseer(instruments=[_argv])
+    ov([program("argv"), *args])
+    assert results == [args]
+    assert ov.overhead is None
+
+
+def test_startup_profile_overhead(data_fds, capdata, capsys, monkeypatch):
+    from voir import startup
+    from voir.phase import _AccountedObserver
+
+    profile = startup.StartupProfile()
+    monkeypatch.setattr(startup, "startup_profile", profile)
+    during_script = []
+
+    def _probe(ov):
+        yield ov.phases.init
+        time.sleep(0.01)
+
+        def record(_):
+            during_script.append((ov.overhead, [type(o) for o in ov.given._observers]))
+
+        ov.given.where("n") >> record
+
+    ov = Overseer(instruments=[_probe], logfile=data_fds[1])
+    ov([program("giver")])
+
+    # The startup is broken down by instrument, but the script is not slowed
+    # down by accounting, and no instrument_overhead event is logged
+    assert (
+        profile.sections["instruments"]["test_startup_profile_overhead.<locals>._probe"]
+        > 0
+    )
+    assert during_script
+    for overhead, observers in during_script:
+        assert overhead is None
+        assert _AccountedObserver not in observers
+    assert "instrument_overhead" not in capdata()
+    assert "voir: startup profile" in capsys.readouterr().err
+
+
+def test_no_instrument_overhead(ov, capdata):
+    ov.require(_slow)
+    ov([program("giver")])
+    assert "instrument_overhead" not in capdata()
+
+
+def test_phase_timings(tmp_path):
+    logfile = tmp_path / "data.jsonl"
+    ov = Overseer(instruments=[], logfile=str(logfile))
+    ov([program("hello")])
+    events = [json.loads(line) for line in logfile.read_text().splitlines()]
+    starts = {e["$data"]["name"]: e["$data"] for e in events if e["$event"] == "phase"}
+    ends = {
+        e["$data"]["name"]: e["$data"] for e in events if e["$event"] == "phase_end"
+    }
+    assert (
+        list(starts)
+        == list(ends)
+        == [
+            "init",
+            "parse_args",
+            "load_script",
+            "run_script",
+            "finalize",
+        ]
+    )
+    for name, end in ends.items():
+        start = starts[name]
+        assert end["perf_counter_ns"] >= start["perf_counter_ns"]
+        assert (
+            end["duration"] == (end["perf_counter_ns"] - start["perf_counter_ns"]) / 1e9
+        )
+        assert end["cpu_duration"] >= 0
+        assert end["maxrss"] >= start["maxrss"] > 0
+
+
+def test_repeat(ov, outlines, capdata):
+    ov.require(_probe)
+    ov(
+        [
+            "--probe",
+            "//main > greeting",
+            "--repeat",
+            "3",
+            "--warmup",
+            "1",
+            program("hello"),
+        ]
+    )
+    assert outlines() == ["hello world"] * 4
+    events = [json.loads(line) for line in capdata().split("\n") if line]
+    iterations = [e["$data"] for e in events if e.get("$event") == "iteration_end"]
+    assert [(it["index"], it["warmup"]) for it in iterations] == [
+        (0, True),
+        (1, False),
+        (2, False),
+        (3, False),
+    ]
+    greetings = [e for e in events if "greeting" in e]
+    assert [e["$iteration"] for e in greetings] == [0, 1, 2, 3]
+    (summary,) = [e["$data"] for e in events if e.get("$event") == "repeat_summary"]
+    assert summary["warmup"] == 1
+    assert summary["repeat"] == 3
+    assert summary["times"] == [it["duration"] for it in iterations[1:]]
+    low, high = summary["ci95"]
+    assert low <= summary["mean"] <= high
+
+
+def test_repeat_invalid(ov):
+    with pytest.raises(SystemExit):
+        ov(["--repeat", "0", program("hello")])
+
+
+def test_summarize_times():
+    summary = summarize_times([1.0, 2.0, 3.0])
+    assert summary["mean"] == 2.0
+    assert summary["std"] == 1.0
+    assert summary["ci95"] == pytest.approx([2 - 4.303 / 3**0.5, 2 + 4.303 / 3**0.5])
+    assert summarize_times([1.0])["ci95"] is None
@@ -1,3 +1,4 @@
+import asyncio
 import threading
 
 import pytest
@@ -155,6 +156,79 @@ def test_order(ov):
     ]
 
 
+def test_async(ov):
+    main_thread = threading.current_thread()
+    threads = set()
+
+    @ov.require
+    async def handler_A(ov, seq):
+        seq.append("A0")
+        yield ov.phases.one
+        await asyncio.sleep(0)
+        seq.append("A1")
+        two = yield ov.phases.two(priority=1)
+        seq.append(f"A2={two}")
+        threads.add(threading.current_thread())
+
+    @ov.require
+    async def handler_B(ov, seq):
+        seq.append("B0")
+        yield ov.phases.two(priority=2)
+        seq.append("B2")
+        threads.add(threading.current_thread())
+
+    ov(1, 2, 3, 4)
+    assert not ov.errors
+    assert ov.results == ["A0", "B0", 1, "A1", 2, "B2", "A2=2", 3, 4, 5]
+    assert len(threads) == 1 and main_thread not in threads
+    assert ov._loop is None
+
+
+def test_async_background_task(ov):
+    ticks = []
+
+    @ov.require
+    async def handler_poller(ov, seq):
+        async def poll():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.001)
+
+        yield ov.phases.one
+        task = asyncio.create_task(poll())
+        yield ov.phases.four
+        # The task ran on the loop thread while the main thread was busy
+        assert ticks
+        task.cancel()
+
+    ov(1, 2, 3, 4)
+    assert not ov.errors
+
+
+def test_async_error(ov):
+    @ov.require
+    async def handler_A(ov, seq):
+        yield ov.phases.one
+        raise TypeError("boom")
+
+    ov(1, 2, 3, 4)
+    assert ov.errors == [TypeError]
+    assert ov.results == [1, 2, 3, 4, 5]
+
+
+def test_async_phase_error(ov):
+    @ov.require
+    async def handler_A(ov, seq):
+        try:
+            yield ov.phases.two
+        except ValueError:
+            seq.append("caught")
+
+    with pytest.raises(ValueError):
+        ov(1, ValueError(), 3, 4)
+    assert ov.results == [1, ValueError, "caught"]
+
+
 def test_partial_phases(ov):
     @ov.require
     def handler_A(ov, seq):
@@ -599,15 +673,19 @@ def test_rerun(ov):
 
 
 class LightGivenOverseer(GivenOverseer):
-    def __init__(self):
+    def __init__(self, drain_interval=None):
         self.errors = []
         self.error_values = []
         super().__init__(
             ["one", "two", "three", "four"],
             args=[self],
             kwargs={},
+            drain_interval=drain_interval,
         )
 
+    def _on_instrument_error(self, err):
+        self.errors.append(type(err))
+
     def _run_phase(self, phase, value):
         with self.run_phase(phase) as set_value:
             if isinstance(value, Exception):
@@ -690,3 +768,98 @@ def test_gov_thread(gov):
     gov(1, 2, 3, 4)
     assert not gov.errors
     assert 4321 in results
+
+
+def test_gov_drain_thread():
+    gov = LightGivenOverseer(drain_interval=0.01)
+    results = []
+    received = threading.Event()
+
+    def q(ov):
+        ov.give(value=4321)
+
+    @gov.require
+    def handler_accumulator(ov):
+        yield ov.phases.one
+        ov.given["?value"].accum(results)
+        ov.given["?value"].filter(lambda x: x == 4321).subscribe(
+            lambda _: received.set()
+        )
+
+    @gov.require
+    def handler_v(ov):
+        yield ov.phases.one
+        thr = threading.Thread(target=q, args=(ov,))
+        thr.start()
+        thr.join()
+        # The main thread gives nothing, the drain thread must push the data
+        assert received.wait(5)
+        assert results[-1] == 4321
+
+    gov(1, 2, 3, 4)
+    assert not gov.errors
+    assert results == [4321, 2, 3, 4, 5]
+    assert gov.queue_stats["drained"] == 1
+    assert gov.queue_stats["max_wait"] < 5
+
+
+def test_gov_drain_thread_errors():
+    gov = LightGivenOverseer(drain_interval=0.01)
+    results = []
+    drained = threading.Event()
+
+    @gov.require
+    def handler_accumulator(ov):
+        yield ov.phases.one
+
+        def check(value):
+            if value == 1234:
+                raise ValueError("bad value")
+            results.append(value)
+            if value == 4321:
+                drained.set()
+
+        ov.given["?value"] >> check
+
+    @gov.require
+    def handler_v(ov):
+        yield ov.phases.one
+        thr = threading.Thread(
+            target=lambda: (ov.give(value=1234), ov.give(value=4321))
+        )
+        thr.start()
+        thr.join()
+        # The error does not stop the drain thread
+        assert drained.wait(5)
+
+    gov(1, 2, 3, 4)
+    assert gov.errors == [ValueError]
+    assert results == [4321, 2, 3, 4, 5]
+
+
+def test_gov_listens_to_steps():
+    def check(subscribe, expected):
+        gov = LightGivenOverseer()
+        gov._prepare()
+        subscribe(gov.given)
+        assert gov.given.listens_to_steps is expected
+        gov._finish()
+
+    def noop(_):
+        pass
+
+    def wrapper():
+        yield
+
+    check(lambda gv: None, False)
+    check(lambda gv: gv.where("$event") >> noop, False)
+    check(lambda gv: gv["?loss"].map(str) >> noop, False)
+    check(lambda gv: gv.wrap("other", wrapper), False)
+    check(lambda gv: gv.wmap("other", wrapper) >> noop, False)
+    check(lambda gv: gv >> noop, True)
+    check(lambda gv: gv.map(str) >> noop, True)
+    check(lambda gv: gv.where("progress") >> noop, True)
+    check(lambda gv: gv.where(task="train") >> noop, True)
+    check(lambda gv: gv["?batch_size"] >> noop, True)
+    check(lambda gv: gv.wmap("step", wrapper) >> noop, True)
+    check(lambda gv: gv.where("!$queued") >> noop, True)
@@ -1,9 +1,12 @@
 import json
+import os
 from dataclasses import dataclass
 
 from voir.proc import LogEntry, run
 from voir.smuggle import encode_as_escape_sequence
 
+from .conftest import _progdir, redact_phase_timings
+
 
 @dataclass
 class LogWithIndex(LogEntry):
@@ -51,3 +54,42 @@ def test_run_stdout():
             assert entry.data == secret
             found += 1
     assert found == 2
+
+
+def _data_entries(compact):
+    results = run(
+        ["voir", "giver.py"],
+        timeout=None,
+        info={},
+        cwd=_progdir,
+        env={**os.environ, "VOIRFILE": "voirfile_fw.py"},
+        compact=compact,
+    )
+    return [
+        (entry.event, redact_phase_timings(entry.event, entry.data))
+        for entry in results
+        if entry.pipe == "data"
+    ]
+
+
+def test_run_compact():
+    expected = _data_entries(compact=False)
+    assert any(event == "data" for event, _ in expected)
+    assert _data_entries(compact=True) == expected
+
+
+def test_run_schema_records():
+    records = [
+        [1, 2],
+        {"$schema": "mine", "x": 1},
+        {"$schema": 0, "$keys": ["a", "b"]},
+        [0, 1, 2],
+    ]
+    results = run(
+        ["echo", *(encode_as_escape_sequence(f"{json.dumps(r)}\n") for r in records)],
+        timeout=None,
+        info={},
+        use_stdout=True,
+    )
+    data = [entry.data for entry in results if entry.pipe == "data"]
+    assert data == [[1, 2], {"$schema": "mine", "x": 1}, {"a": 1, "b": 2}]
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from voir.scriptutils import _cache_path, resolve_script, split_script
+
+script_source = """
+import sys
+
+def f(x):
+    return x + 1
+
+print(f(1))
+"""
+
+
+@pytest.fixture(autouse=True)
+def write_bytecode(monkeypatch):
+    monkeypatch.setattr("sys.dont_write_bytecode", False)
+    # resolve_script replaces __main__
+    monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
+
+
+def _write(tmp_path, source=script_source):
+    script = str(tmp_path / "script.py")
+    with open(script, "w") as f:
+        f.write(source)
+    return script
+
+
+def _results(script, capsys):
+    resolve_script(script)()
+    return capsys.readouterr().out
+
+
+def test_split_script_cache(tmp_path, capsys):
+    script = _write(tmp_path)
+    cache = _cache_path(script)
+    assert not os.path.exists(cache)
+    assert _results(script, capsys) == "2\n"
+    assert os.path.exists(cache)
+    mtime = os.stat(cache).st_mtime_ns
+    assert _results(script, capsys) == "2\n"
+    assert os.stat(cache).st_mtime_ns == mtime
+
+
+def test_split_script_cache_invalidated(tmp_path, capsys):
+    script = _write(tmp_path)
+    assert _results(script, capsys) == "2\n"
+    _write(tmp_path, script_source.replace("x + 1", "x + 2"))
+    assert _results(script, capsys) == "3\n"
+
+
+def test_split_script_cache_corrupt(tmp_path, capsys):
+    script = _write(tmp_path)
+    split_script(script)
+    cache = _cache_path(script)
+    with open(cache, "rb") as f:
+        data = f.read()
+    with open(cache, "wb") as f:
+        f.write(data[:-10])
+    assert _results(script, capsys) == "2\n"
+
+
+def test_split_script_no_cache(tmp_path, capsys):
+    script = _write(tmp_path)
+    prep, run = split_script(script, cache=False)
+    assert not os.path.exists(_cache_path(script))
+    assert prep.co_filename == script
+
+
+def test_split_script_dont_write_bytecode(tmp_path, monkeypatch):
+    monkeypatch.setattr("sys.dont_write_bytecode", True)
+    script = _write(tmp_path)
+    split_script(script)
+    assert not os.path.exists(_cache_path(script))
+
+
+def test_split_script_cache_optimize(tmp_path):
+    script = _write(tmp_path, "print('start')\nassert False, 'checked'\n")
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+
+    def run(*flags):
+        return subprocess.run(
+            [
+                sys.executable,
+                *flags,
+                "-c",
+                f"from voir.scriptutils import resolve_script; resolve_script({script!r})()",
+            ],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+
+    # The asserts are stripped with -O, but not in a later normal run
+    assert run("-O").returncode == 0
+    result = run()
+    assert result.returncode != 0
+    assert "checked" in result.stderr
+    assert run("-O").returncode == 0
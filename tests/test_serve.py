@@ -0,0 +1,121 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from voir.proc import run
+
+from .common import _progdir
+
+
+def _start_server(sock, *args):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "voir", "serve", "--socket", str(sock), *args],
+        cwd=_progdir,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    for _ in range(200):
+        if os.path.exists(sock) or proc.poll() is not None:
+            break
+        time.sleep(0.05)
+    return proc
+
+
+@pytest.fixture
+def server(tmp_path):
+    sock = tmp_path / "voir.sock"
+    proc = _start_server(sock, "--preload", "json")
+    yield str(sock)
+    proc.terminate()
+    proc.wait(timeout=10)
+    assert not os.path.exists(sock)
+
+
+def _run(server, argv):
+    env = {**os.environ, "VOIR_SERVER": server, "VOIRFILE": ""}
+    return list(
+        run(
+            ["voir", *argv],
+            info={},
+            cwd=_progdir,
+            env=env,
+            timeout=None,
+            buffered=False,
+        )
+    )
+
+
+def test_serve(server):
+    results = _run(server, ["hello.py"])
+    stdout = "".join(r.data for r in results if r.pipe == "stdout")
+    assert stdout == "hello world\n"
+    phases = [r.data["name"] for r in results if r.event == "phase"]
+    assert phases == ["init", "parse_args", "load_script", "run_script", "finalize"]
+    assert results[-1].data["return_code"] == 0
+
+
+def test_serve_return_code(server):
+    results = _run(server, ["zero.py"])
+    stderr = "".join(r.data for r in results if r.pipe == "stderr")
+    assert "ZeroDivisionError" in stderr
+    assert results[-1].data["return_code"] == 1
+
+
+def test_serve_many(server):
+    for _ in range(3):
+        results = _run(server, ["hello.py"])
+        assert results[-1].data["return_code"] == 0
+
+
+def test_serve_refuses_threads(tmp_path):
+    proc = _start_server(tmp_path / "voir.sock", "--preload", "threadstart")
+    _, err = proc.communicate(timeout=10)
+    assert proc.returncode != 0
+    assert "sleeper" in err
+
+
+def test_serve_allow_threads(tmp_path):
+    sock = tmp_path / "voir.sock"
+    proc = _start_server(sock, "--preload", "threadstart", "--allow-threads")
+    try:
+        assert _run(str(sock), ["hello.py"])[-1].data["return_code"] == 0
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def test_serve_refuses_live_socket(server):
+    proc = _start_server(server)
+    _, err = proc.communicate(timeout=10)
+    assert proc.returncode != 0
+    assert "another server is listening" in err
+    # The first server still works
+    assert _run(server, ["hello.py"])[-1].data["return_code"] == 0
+
+
+def test_serve_refuses_non_socket(tmp_path):
+    path = tmp_path / "voir.sock"
+    path.write_text("precious")
+    proc = _start_server(path)
+    _, err = proc.communicate(timeout=10)
+    assert proc.returncode != 0
+    assert "is not a socket" in err
+    assert path.read_text() == "precious"
+
+
+def test_serve_replaces_stale_socket(tmp_path):
+    sock = tmp_path / "voir.sock"
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(sock))
+    stale.close()
+    proc = _start_server(sock)
+    try:
+        assert "listening" in proc.stderr.readline()
+        assert _run(str(sock), ["hello.py"])[-1].data["return_code"] == 0
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)